@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import queue
+import base64
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from metrics import span, recorder, RUNS_DIR
+
+# Span outcomes that count as a failed step. "absent" (no cookie banner) and "stale" (a cached
+# deep link that no longer works, after which the widget is clicked instead) are expected
+FAILURES = ("error", "timeout", "not_found")
+SECTION = ".findpastpapers"
+SECTION_JS = "var el = document.querySelector(arguments[0]); return el ? el.outerHTML : null;"
+
+class ArtifactRecorder:
+    """Keeps the last `size` widget steps in memory and writes them out only when a step fails.
+
+    Every step is remembered as its name, URL, timing and outcome. A failing
+    step also captures a screenshot and the widget's outerHTML; with trace
+    (for development) every step does. Nothing touches the disk on the
+    scraping thread: a failure hands the buffer to a writer thread, which
+    decodes and writes it to runs/artifacts/<run>/<n>-<step>/.
+    """
+
+    def __init__(self, size=20, trace=False, root=None, section=SECTION):
+        self.ring = deque(maxlen=size)
+        self.trace = trace
+        self.section = section
+        self.root = root or os.path.join(RUNS_DIR, "artifacts", recorder.run.get('id') or time.strftime("%Y%m%d-%H%M%S"))
+        self.failures = 0
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._writer, name="artifact-writer", daemon=True)
+        self.thread.start()
+
+    def _entry(self, s, url, failed):
+        return {
+            'step': s.name,
+            'attrs': {k: str(v) for k, v in s.attrs.items()},
+            'url': url,
+            'started': s.wall_start,
+            'duration': round(time.perf_counter() - s.start, 4),
+            'outcome': s.outcome if s.outcome != "ok" or not failed else "error",
+        }
+
+    def record(self, driver, s, failed):
+        """Remember a finished Selenium step; flush the buffer if it failed."""
+        try:
+            entry = self._entry(s, driver.current_url, failed)
+            if self.trace or failed:
+                # Base64 text as the driver returns it; decoding happens on the writer thread
+                entry['screenshot_b64'] = driver.get_screenshot_as_base64()
+                entry['html'] = driver.execute_script(SECTION_JS, self.section)
+        except Exception as e:
+            entry = self._entry(s, None, failed)
+            entry['capture_error'] = str(e)[:200]
+        self._add(entry, failed)
+
+    async def record_async(self, page, s, failed):
+        """Remember a finished Playwright step; flush the buffer if it failed."""
+        try:
+            entry = self._entry(s, page.url, failed)
+            if self.trace or failed:
+                entry['screenshot'] = await page.screenshot()
+                entry['html'] = await page.evaluate("section => (function () {" + SECTION_JS + "}).call(null, section)", self.section)
+        except Exception as e:
+            entry = self._entry(s, None, failed)
+            entry['capture_error'] = str(e)[:200]
+        self._add(entry, failed)
+
+    def _add(self, entry, failed):
+        with self.lock:
+            self.ring.append(entry)
+            if not failed:
+                return
+            self.failures += 1
+            snapshot, n = list(self.ring), self.failures
+            self.ring.clear()
+        self.queue.put((n, entry['step'], snapshot))
+
+    def _writer(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            n, step_name, snapshot = item
+            try:
+                self._write(n, step_name, snapshot)
+            except Exception as e:
+                logging.warning(f"Could not write debug artifacts for {step_name}: {e}")
+
+    def _write(self, n, step_name, snapshot):
+        folder = os.path.join(self.root, f"{n:03d}-{step_name}")
+        os.makedirs(folder, exist_ok=True)
+        index = []
+        for i, entry in enumerate(snapshot):
+            entry = dict(entry)
+            stem = f"{i:02d}-{entry['step']}"
+            png = entry.pop('screenshot', None)
+            if entry.get('screenshot_b64'):
+                png = base64.b64decode(entry.pop('screenshot_b64'))
+            if png:
+                with open(os.path.join(folder, f"{stem}.png"), "wb") as f:
+                    f.write(png)
+                entry['screenshot'] = f"{stem}.png"
+            html = entry.pop('html', None)
+            if html:
+                with open(os.path.join(folder, f"{stem}.html"), "w", encoding="utf-8") as f:
+                    f.write(html)
+                entry['html'] = f"{stem}.html"
+            index.append(entry)
+        with open(os.path.join(folder, "steps.json"), "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=1)
+        logging.info(f"Step {step_name} failed; last {len(snapshot)} steps written to {folder}")
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+def _failed(s, raised):
+    return raised or s.outcome in FAILURES
+
+@contextmanager
+def step(driver, name, **attrs):
+    """A metrics span that is also recorded by the driver's ArtifactRecorder (driver.artifacts), if it has one."""
+    with span(name, **attrs) as s:
+        raised = False
+        try:
+            yield s
+        except BaseException:
+            raised = True
+            raise
+        finally:
+            artifacts = getattr(driver, "artifacts", None)
+            if artifacts is not None:
+                artifacts.record(driver, s, _failed(s, raised))
+
+@asynccontextmanager
+async def async_step(page, name, **attrs):
+    """step() for a Playwright page."""
+    with span(name, **attrs) as s:
+        raised = False
+        try:
+            yield s
+        except BaseException:
+            raised = True
+            raise
+        finally:
+            artifacts = getattr(page, "artifacts", None)
+            if artifacts is not None:
+                await artifacts.record_async(page, s, _failed(s, raised))
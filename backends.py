@@ -0,0 +1,325 @@
+import re
+import asyncio
+import logging
+from functools import partial
+from http_backend import results_from_anchors, series_from_anchors
+from papers import Document, iter_documents, iter_http_documents, unseen, setup_driver, LOW_MEMORY_ARGS, ANCHORS_JS, SPEC_CLICK_JS, _series_predicate
+from browser_pool import BrowserPool
+from request_filters import RequestFilter, apply_playwright_async, collect_selenium
+from widget_api import PAST_PAPERS_URL
+from artifacts import async_step
+from taxonomy import Taxonomy, is_deep_link
+from ratelimit import mount
+from transport import make_session
+
+# Playwright is optional; only the playwright backend needs it
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    async_playwright = None
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Every backend offers the same four calls, so core.py can drive any of them:
+#   documents(qualification, subject, spec, series_filter) -> Documents, one series at a time
+#   prepare_session(session) -> copy cookies / user agent into the download session
+#   bytes_transferred()      -> bytes the backend pulled while navigating
+#   recycle()                -> replace the browser (if any) to give its memory back
+#   close()
+
+class SeleniumBackend:
+    """The widget driven click by click in Chrome (papers.py)."""
+    name = "selenium"
+
+    def __init__(self, filter_profile="minimal", pool=None, prelaunch=True, taxonomy=None, low_memory=False, artifacts=None,
+                 headless=False):
+        self.pool = pool or BrowserPool(size=1, factory=partial(setup_driver, filter_profile, low_memory, headless), prelaunch=prelaunch)
+        self.taxonomy = taxonomy if taxonomy is not None else Taxonomy()
+        self.artifacts = artifacts
+        self.driver = None
+
+    def _driver(self):
+        if self.driver is None:
+            self.driver = self.pool.checkout()
+            # Picked up by every papers.step() on this driver
+            self.driver.artifacts = self.artifacts
+        return self.driver
+
+    def documents(self, qualification, subject, spec=None, series_filter=None):
+        yield from iter_documents(qualification, subject, series_filter=series_filter, spec=spec,
+                                  backend="browser", driver=self._driver(), taxonomy=self.taxonomy)
+
+    def prepare_session(self, session):
+        if self.driver is None:
+            return
+        for cookie in self.driver.get_cookies():
+            session.cookies.set(cookie['name'], cookie['value'])
+        session.headers.update({'User-Agent': self.driver.execute_script("return navigator.userAgent")})
+
+    def bytes_transferred(self):
+        filt = collect_selenium(self.driver) if self.driver is not None else None
+        return filt.bytes_loaded if filt else 0
+
+    def recycle(self):
+        if self.driver is not None:
+            self.pool.retire(self.driver)
+            self.driver = None
+
+    def close(self):
+        if self.driver is not None:
+            self.pool.checkin(self.driver)
+            self.driver = None
+        self.pool.close()
+        self.taxonomy.save()
+
+class HttpBackend:
+    """Replays the captured widget endpoints (widget_api.py) on the chosen transport (transport.py).
+
+    With a fallback backend, series the captured endpoints cannot serve are
+    read through the browser instead of failing the job.
+    """
+    name = "http"
+
+    def __init__(self, fallback=None, throttle=None, transport="requests"):
+        self.fallback = fallback
+        self.session = make_session(transport)
+        if throttle is not None:
+            mount(self.session, throttle)
+        self.bytes = 0
+        self.session.hooks['response'].append(self._count)
+
+    def _count(self, response, *args, **kwargs):
+        self.bytes += len(response.content)
+
+    def documents(self, qualification, subject, spec=None, series_filter=None):
+        if self.fallback is None:
+            yield from iter_documents(qualification, subject, series_filter=series_filter, spec=spec,
+                                      backend="http", session=self.session)
+            return
+        done = set()
+        seen = set()
+        predicate = _series_predicate(series_filter)
+        try:
+            yield from iter_http_documents(self.session, qualification, subject, spec, predicate, done, seen)
+            return
+        except Exception as e:
+            logging.warning(f"HTTP backend failed for {subject} ({e}); falling back to {self.fallback.name}")
+        yield from unseen(self.fallback.documents(qualification, subject, spec, lambda s: predicate(s) and s not in done), seen)
+
+    def prepare_session(self, session):
+        session.cookies.update(self.session.cookies)
+        if self.fallback is not None:
+            self.fallback.prepare_session(session)
+
+    def bytes_transferred(self):
+        return self.bytes + (self.fallback.bytes_transferred() if self.fallback is not None else 0)
+
+    def recycle(self):
+        if self.fallback is not None:
+            self.fallback.recycle()
+
+    def close(self):
+        if self.fallback is not None:
+            self.fallback.close()
+
+# --- Playwright -------------------------------------------------------------
+
+def safe_filename(text):
+    return "".join([c for c in text if c.isalnum() or c in (' ', '-', '_', '.', '(', ')')]).strip()
+
+async def open_subject(page, qualification, subject, spec=None):
+    """Load the widget and select qualification -> letter -> subject (-> spec in the modal)."""
+    async with async_step(page, "page_load"):
+        await page.goto(PAST_PAPERS_URL, timeout=60000)
+    async with async_step(page, "cookie_banner") as s:
+        try:
+            await page.click("#onetrust-accept-btn-handler", timeout=5000)
+        except:
+            s.fail("absent")
+    async with async_step(page, "widget_ready"):
+        await page.wait_for_selector(".findpastpapers", timeout=30000)
+    widget = page.locator(".findpastpapers")
+
+    async with async_step(page, "qualification", qualification=qualification):
+        await widget.get_by_text(qualification, exact=True).filter(visible=True).first.click(force=True)
+        try:
+            current_tab = widget.get_by_text("Current qualifications").filter(visible=True).first
+            if await current_tab.count() > 0:
+                await current_tab.click(force=True)
+        except: pass
+
+    letter = subject[0].upper()
+    async with async_step(page, "letter", letter=letter):
+        await widget.locator("li").filter(has_text=re.compile(f"^\\s*{letter}\\s*$")).filter(visible=True).first.click(force=True)
+    async with async_step(page, "subject", subject=subject):
+        subject_link = widget.get_by_role("link").filter(has_text=subject).filter(visible=True).first
+        await subject_link.wait_for(state="visible", timeout=15000)
+        # Prefer an exact match so "Mathematics" does not pick "Further Mathematics"
+        exact = widget.get_by_role("link").filter(has_text=re.compile(f"^\\s*{re.escape(subject)}\\s*$", re.I)).filter(visible=True).first
+        if await exact.count() > 0:
+            subject_link = exact
+        await subject_link.click(force=True)
+
+    if spec:
+        async with async_step(page, "spec_modal", spec=spec) as s:
+            try:
+                await page.locator("a h3", has_text=spec).first.wait_for(state="attached", timeout=6000)
+                await page.evaluate("spec => (function () {" + SPEC_CLICK_JS + "}).call(null, spec)", spec)
+            except Exception as e:
+                logging.info(f"No {spec} specification modal for {subject}: {e}")
+                s.fail("not_found")
+    async with async_step(page, "series_list"):
+        await page.locator("#step3 a").first.wait_for(state="attached", timeout=15000)
+
+async def anchors(page, selector=None):
+    """Every anchor under selector as {href, classes, text, title}, in one page.evaluate round trip."""
+    return await page.evaluate("selector => (function () {" + ANCHORS_JS + "}).call(null, selector)", selector)
+
+async def list_series(page, qualification, subject, spec=None):
+    """Open a subject and return its series as [{'label', 'href'}]."""
+    await open_subject(page, qualification, subject, spec)
+    return series_from_anchors(await anchors(page, "#step3"), page.url)
+
+async def series_results(page, series):
+    """Open one series of an already selected subject and return its rows as {'href', 'title'}."""
+    async with async_step(page, "series", series=series):
+        await page.locator("#step3 a").filter(has_text=series).first.click(force=True)
+        await page.wait_for_selector("a[href*='.pdf']", timeout=20000)
+    async with async_step(page, "extract", series=series) as e:
+        found = await anchors(page, "#resultsTable")
+        if not any("result-item" in a['classes'] for a in found):
+            found = await anchors(page)
+        results = results_from_anchors(found, page.url)
+        e.add("anchors", len(found))
+        e.add("links", len(results))
+    return results
+
+async def read_series_link(page, href, series, timeout=5000):
+    """Results of a series loaded straight from its cached link, or None if the link no longer leads to them."""
+    async with async_step(page, "deep_link") as s:
+        try:
+            await page.goto(href, timeout=60000)
+            await page.wait_for_selector("a.result-item, a[href*='.pdf']", timeout=timeout)
+        except Exception as e:
+            logging.info(f"Cached link for {series} did not load results: {e}")
+            s.fail("stale")
+            return None
+    async with async_step(page, "extract", series=series) as e:
+        found = results_from_anchors(await anchors(page), page.url)
+        e.add("links", len(found))
+    return found or None
+
+class PlaywrightBackend:
+    """The widget driven in one Playwright page, run on a private event loop."""
+    name = "playwright"
+
+    def __init__(self, filter_profile="minimal", headless=True, taxonomy=None, low_memory=False, artifacts=None):
+        if async_playwright is None:
+            raise ImportError("The playwright backend needs the playwright package")
+        self.taxonomy = taxonomy if taxonomy is not None else Taxonomy()
+        self.artifacts = artifacts
+        self.headless = headless
+        self.low_memory = low_memory
+        self.loop = asyncio.new_event_loop()
+        self.request_filter = RequestFilter(filter_profile)
+        self.playwright = self._run(async_playwright().start())
+        self._launch()
+
+    def _launch(self):
+        args = LOW_MEMORY_ARGS if self.low_memory else []
+        self.browser = self._run(self.playwright.chromium.launch(headless=self.headless, args=args))
+        self.context = self._run(self.browser.new_context(viewport={'width': 1920, 'height': 1080}, user_agent=USER_AGENT))
+        self._run(apply_playwright_async(self.context, filt=self.request_filter))
+        self.page = self._run(self.context.new_page())
+        self.page.artifacts = self.artifacts
+
+    def recycle(self):
+        try:
+            self._run(self.browser.close())
+        except: pass
+        self._launch()
+
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def _series(self, qualification, subject, spec, predicate):
+        """The subject's target series, from the taxonomy when every one has a deep link, else by opening the subject.
+
+        A cached list with no wanted series is a miss: the series may have been
+        published since it was recorded.
+        """
+        entry = self.taxonomy.get(qualification, subject, spec)
+        if entry:
+            cached = [x for x in entry['series'] if predicate(x['label'])]
+            if cached and all(is_deep_link(x['href']) for x in cached):
+                return cached, False
+        series = self._run(list_series(self.page, qualification, subject, spec))
+        if series:
+            self.taxonomy.record(qualification, subject, spec, self.page.url, series)
+        return [x for x in series if predicate(x['label'])], True
+
+    def documents(self, qualification, subject, spec=None, series_filter=None):
+        predicate = _series_predicate(series_filter)
+        targets, on_subject = self._series(qualification, subject, spec, predicate)
+        logging.info(f"Found {len(targets)} target exam series: {[x['label'] for x in targets]}")
+        for x in targets:
+            series_name = x['label']
+            logging.info(f"--- Processing Series: {series_name} ---")
+            try:
+                results = None
+                if is_deep_link(x['href']):
+                    results = self._run(read_series_link(self.page, x['href'], series_name))
+                    self.taxonomy.hit(results is not None)
+                    if results is None:
+                        self.taxonomy.invalidate(qualification, subject, spec)
+                        on_subject = False
+                if results is None:
+                    if not on_subject:
+                        # Results replace the series list, so start again from the subject
+                        self._run(open_subject(self.page, qualification, subject, spec))
+                    results = self._run(series_results(self.page, series_name))
+                on_subject = False
+            except Exception as e:
+                logging.error(f"Error processing series {series_name}: {e}")
+                on_subject = False
+                continue
+            for r in results:
+                yield Document(qualification, subject, series_name, r['title'], r['href'])
+
+    def prepare_session(self, session):
+        for cookie in self._run(self.context.cookies()):
+            session.cookies.set(cookie['name'], cookie['value'])
+        session.headers.update({'User-Agent': USER_AGENT})
+
+    def bytes_transferred(self):
+        return self.request_filter.bytes_loaded
+
+    def close(self):
+        self.request_filter.report()
+        self.taxonomy.save()
+        try:
+            self._run(self.browser.close())
+            self._run(self.playwright.stop())
+        except: pass
+        self.loop.close()
+
+BACKENDS = ["selenium", "playwright", "http", "auto"]
+
+def make_backend(name, filter_profile="minimal", headless=True, prelaunch=True, low_memory=False, artifacts=None,
+                 throttle=None, transport="requests"):
+    """Build a backend by name. "auto" is HTTP with Selenium for whatever it cannot serve.
+
+    artifacts is an ArtifactRecorder for the browser steps; the HTTP backend has none to record.
+    throttle (ratelimit.Throttle) paces and retries the HTTP backend's requests to the widget endpoints,
+    which go out on transport ("requests" or "httpx", see transport.py).
+    """
+    if name == "selenium":
+        return SeleniumBackend(filter_profile, prelaunch=prelaunch, low_memory=low_memory, artifacts=artifacts, headless=headless)
+    if name == "playwright":
+        return PlaywrightBackend(filter_profile, headless=headless, low_memory=low_memory, artifacts=artifacts)
+    if name == "http":
+        return HttpBackend(throttle=throttle, transport=transport)
+    if name == "auto":
+        fallback = SeleniumBackend(filter_profile, prelaunch=False, low_memory=low_memory, artifacts=artifacts, headless=headless)
+        return HttpBackend(throttle=throttle, transport=transport, fallback=fallback)
+    raise ValueError(f"Unknown backend {name!r}; choose from {BACKENDS}")
@@ -0,0 +1,145 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+import simulator
+from benchmark import measured_run
+from core import JOBS
+
+# Dataset scale x site behaviour. Every scenario runs against a fresh simulator.
+SCENARIOS = [
+    {'name': "small", 'scale': 10, 'latency': 0.02},
+    {'name': "medium", 'scale': 1000, 'latency': 0.02},
+    {'name': "large", 'scale': 10000, 'latency': 0.02},
+    {'name': "slow", 'scale': 1000, 'latency': 0.2, 'jitter': 0.05},
+    {'name': "flaky", 'scale': 1000, 'latency': 0.02, 'error_rate': 0.05},
+]
+SITE_OPTIONS = ("scale", "latency", "jitter", "error_rate", "pdf_kb", "image_kb")
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def run_scenario(scenario, backend, job="igcse-maths", workers=4, filter_profile="minimal", discover_only=False,
+                 transport="requests"):
+    """Serve the scenario's site, run the job on backend against it and return the measured row."""
+    options = {k: scenario[k] for k in SITE_OPTIONS if k in scenario}
+    server, page_url = simulator.start(**options)
+    workdir = tempfile.mkdtemp(prefix=f"suite-{scenario['name']}-{backend}-{transport}-")
+    try:
+        if backend in ("http", "auto"):
+            spec = JOBS[job]['spec']
+            simulator.capture(page_url, JOBS[job]['qualification'], JOBS[job]['subjects'][0], spec=spec,
+                              capture_path=os.path.join(workdir, "widget_capture.json"))
+        env = dict(os.environ, PAST_PAPERS_URL=page_url)
+        row = measured_run(job, backend, workdir, workers, filter_profile, discover_only, env=env, transport=transport)
+    finally:
+        site = server.site.stats()
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    row.update(scenario=scenario['name'], site=site, options=options)
+    series = row['stages'].pop('series_seconds', None) if row.get('stages') else None
+    if series:
+        row['stages']['series_mean'] = sum(series) / len(series)
+        row['stages']['series_max'] = max(series)
+    return row
+
+def run_suite(scenarios, backends, runs=1, job="igcse-maths", workers=4, filter_profile="minimal",
+              discover_only=False, out="bench_results.json", transports=("requests",)):
+    results = []
+    for scenario in scenarios:
+        for backend in backends:
+            for transport in transports:
+                for n in range(runs):
+                    logging.info(f"Suite: {scenario['name']} on {backend} over {transport} (run {n + 1}/{runs})")
+                    row = run_scenario(scenario, backend, job, workers, filter_profile, discover_only, transport)
+                    row['run'] = n + 1
+                    results.append(row)
+                    logging.info(f"  {row['wall_time']:.2f}s, {row['documents']} documents, {row['downloaded']} downloaded"
+                                 + (f", error: {row['error']}" if row.get('error') else ""))
+
+    report = {
+        'commit': git_commit(),
+        'created': time.time(),
+        'python': sys.version.split()[0],
+        'job': job,
+        'filter': filter_profile,
+        'discover_only': discover_only,
+        'results': results,
+    }
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Suite results written to {out}")
+    return report
+
+def compare(old_path, new_path, threshold=0.10, min_delta=0.05):
+    """Print wall time and per-stage changes between two suite result files. Returns the regressions."""
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    def index(report):
+        rows = {}
+        for r in report['results']:
+            # Results from before transports were compared all used requests
+            rows.setdefault((r['scenario'], r['backend'], r.get('transport', "requests")), []).append(r)
+        return rows
+
+    def mean(rows, key, stage=False):
+        values = [(r.get('stages', {}) if stage else r).get(key) for r in rows]
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    before, after = index(old), index(new)
+    regressions = []
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    for key in sorted(set(before) & set(after)):
+        for metric, stage in (("wall_time", False), ("discover", True), ("drain", True), ("series_mean", True)):
+            a, b = mean(before[key], metric, stage), mean(after[key], metric, stage)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            # Ignore noise on stages that only take a few milliseconds
+            flag = "  REGRESSION" if change > threshold and b - a > min_delta else ""
+            print(f"{key[0]:<8} {key[1]:<11} {key[2]:<9} {metric:<12} {a:>9.3f}s -> {b:>9.3f}s  {change:+7.1%}{flag}")
+            if flag:
+                regressions.append((key, metric, change))
+    return regressions
+
+if __name__ == "__main__":
+    from backends import BACKENDS
+    from request_filters import PROFILES
+    from transport import TRANSPORTS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against the local site simulator")
+    parser.add_argument("--scenarios", nargs="+", choices=[s['name'] for s in SCENARIOS], help="default: all")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["http"])
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=["requests"],
+                        help="download transports to compare (httpx needs the httpx package)")
+    parser.add_argument("--job", choices=sorted(JOBS), default="igcse-maths")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--filter", choices=sorted(PROFILES), default="minimal")
+    parser.add_argument("--discover-only", action="store_true")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files instead of running")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+    scenarios = [s for s in SCENARIOS if not args.scenarios or s['name'] in args.scenarios]
+    run_suite(scenarios, args.backends, runs=args.runs, job=args.job, workers=args.workers,
+              filter_profile=args.filter, discover_only=args.discover_only, out=args.out, transports=args.transports)
@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+
+# psutil gives whole-process-tree CPU and memory (browsers run as child processes);
+# without it the benchmark falls back to resource, which is Unix only
+try:
+    import psutil
+except ImportError:
+    psutil = None
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class TreeSampler:
+    """Samples the summed RSS and CPU time of a process and all its descendants."""
+
+    def __init__(self, pid, interval=0.2):
+        self.root = psutil.Process(pid)
+        self.interval = interval
+        self.peak_rss = 0
+        self.cpu = {}
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop.is_set():
+            try:
+                procs = [self.root] + self.root.children(recursive=True)
+            except psutil.Error:
+                return
+            rss = 0
+            for p in procs:
+                try:
+                    rss += p.memory_info().rss
+                    t = p.cpu_times()
+                    self.cpu[p.pid] = t.user + t.system
+                except psutil.Error:
+                    pass
+            self.peak_rss = max(self.peak_rss, rss)
+            self.stop.wait(self.interval)
+
+    def finish(self):
+        self.stop.set()
+        self.thread.join()
+        return sum(self.cpu.values()), self.peak_rss
+
+def measure(cmd, env=None, cwd=None):
+    """Run cmd to completion and return wall time, CPU seconds and peak RSS bytes for its process tree."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, cwd=cwd)
+    sampler = TreeSampler(proc.pid) if psutil else None
+    returncode = proc.wait()
+    wall = time.perf_counter() - started
+
+    result = {'returncode': returncode, 'wall_time': wall, 'cpu_time': None, 'peak_rss': None}
+    if sampler:
+        result['cpu_time'], result['peak_rss'] = sampler.finish()
+        result['rss_method'] = "psutil tree sum"
+    elif before is not None:
+        after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        result['cpu_time'] = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+        # ru_maxrss is the largest single child (KB on Linux, bytes on macOS), not the tree total
+        result['peak_rss'] = after.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+        result['rss_method'] = "largest child (install psutil for the tree total)"
+    return result
+
+def run_child(args):
+    """Body of one measured run: the job on one backend, counters written to args.result."""
+    from core import run
+    stats = run(args.job, backend=args.child, workers=args.workers, filter_profile=args.filter,
+                dest=args.dest, discover_only=args.discover_only, waits_path="waits.json", transport=args.transport)
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+
+def measured_run(job, backend, workdir, workers=4, filter_profile="minimal", discover_only=False, env=None, transport="requests"):
+    """Run one job on one backend in a fresh process inside workdir and return its measurements and counters."""
+    result_path = os.path.join(workdir, "result.json")
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", backend, "--job", job,
+           "--workers", str(workers), "--filter", filter_profile,
+           "--dest", os.path.join(workdir, "papers"), "--result", result_path, "--transport", transport]
+    if discover_only:
+        cmd.append("--discover-only")
+    m = measure(cmd, env=env, cwd=workdir)
+    try:
+        with open(result_path, encoding="utf-8") as f:
+            stats = json.load(f)
+    except Exception:
+        stats = {'error': "run produced no result"}
+
+    row = dict(m, backend=backend, job=job, transport=transport)
+    row['documents'] = stats.get('documents', 0)
+    row['series'] = stats.get('series', 0)
+    row['downloaded'] = stats.get('downloaded', 0)
+    row['page_bytes'] = stats.get('page_bytes', 0)
+    row['download_bytes'] = stats.get('download_bytes', 0)
+    row['bytes_transferred'] = row['page_bytes'] + row['download_bytes']
+    row['stages'] = stats.get('stages', {})
+    if 'error' in stats:
+        row['error'] = stats['error']
+    return row
+
+def benchmark(job, backends, runs=1, workers=4, filter_profile="minimal", discover_only=False, out="benchmark.json"):
+    results = []
+    for backend in backends:
+        for n in range(runs):
+            logging.info(f"Benchmark: {job} on {backend} (run {n + 1}/{runs})")
+            workdir = tempfile.mkdtemp(prefix=f"bench-{backend}-")
+            # The http backend replays the capture from the current directory
+            if os.path.exists("widget_capture.json"):
+                shutil.copy("widget_capture.json", workdir)
+            try:
+                row = measured_run(job, backend, workdir, workers, filter_profile, discover_only)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            row['run'] = n + 1
+            results.append(row)
+
+    report = {'job': job, 'filter': filter_profile, 'discover_only': discover_only, 'created': time.time(), 'results': results}
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_table(results)
+    logging.info(f"Benchmark results written to {out}")
+    return report
+
+def print_table(results):
+    print(f"{'backend':<11} {'run':>3} {'wall s':>8} {'cpu s':>8} {'peak MB':>8} {'MB moved':>9} {'docs':>5}")
+    for r in results:
+        cpu = f"{r['cpu_time']:.1f}" if r['cpu_time'] is not None else "-"
+        rss = f"{r['peak_rss'] / 1024 / 1024:.0f}" if r['peak_rss'] is not None else "-"
+        print(f"{r['backend']:<11} {r['run']:>3} {r['wall_time']:>8.1f} {cpu:>8} {rss:>8} "
+              f"{r['bytes_transferred'] / 1024 / 1024:>9.1f} {r['documents']:>5}" + ("  FAILED" if r.get('error') or r['returncode'] else ""))
+
+if __name__ == "__main__":
+    from core import JOBS
+    from backends import BACKENDS
+    from request_filters import PROFILES
+    from transport import TRANSPORTS
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Run the same job on several backends and compare wall time, CPU, peak RSS and bytes")
+    parser.add_argument("--job", choices=sorted(JOBS), default="igcse-maths")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=["selenium", "playwright", "http"])
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--filter", choices=sorted(PROFILES), default="minimal")
+    parser.add_argument("--discover-only", action="store_true", help="list documents without downloading them")
+    parser.add_argument("--out", default="benchmark.json")
+    # Internal: one measured run in a fresh process
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--dest", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    parser.add_argument("--transport", choices=TRANSPORTS, default="requests", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+    else:
+        benchmark(args.job, args.backends, runs=args.runs, workers=args.workers, filter_profile=args.filter,
+                  discover_only=args.discover_only, out=args.out)
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import mmap
+import errno
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+
+BLOB_DIR = "blobs"
+INDEX_NAME = "index.json"
+CHUNK_SIZE = 1024 * 1024
+
+def hash_file(path):
+    """SHA-256 of a file on disk, read through mmap."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return sha.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for i in range(0, len(m), CHUNK_SIZE):
+                sha.update(m[i:i + CHUNK_SIZE])
+    return sha.hexdigest()
+
+class BlobStore:
+    """Content-addressed store: one copy of every PDF under root/ab/cd/<sha256>.pdf.
+
+    The folder trees the scrapers build are hard links (or, where hard links
+    are not possible, symlinks) to these blobs, so the same paper filed under
+    several series, subjects or jobs takes its space once. An index maps each
+    source URL to its blob and validators, so a URL already held elsewhere is
+    only revalidated (If-None-Match) and linked instead of downloaded again.
+    """
+
+    def __init__(self, root=BLOB_DIR, link="hard"):
+        self.root = root
+        self.link_mode = link
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.urls = {}
+        os.makedirs(root, exist_ok=True)
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self.urls = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable blob index {self.index_path}: {e}")
+
+    def blob_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256[2:4], f"{sha256}.pdf")
+
+    def has(self, sha256):
+        return os.path.exists(self.blob_path(sha256))
+
+    def lookup(self, url):
+        """The index entry for url ({'sha256', 'size', 'etag', 'last_modified'}) if its blob is still present."""
+        with self.lock:
+            entry = self.urls.get(url)
+        if entry and self.has(entry['sha256']):
+            return entry
+        return None
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def add(self, tmp_path, sha256, url=None, headers=None, size=None):
+        """Move a finished download into the store (or drop it if the blob exists) and return the blob path."""
+        blob = self.blob_path(sha256)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(tmp_path)
+        else:
+            # Blobs are shared by every link, so nobody should edit one in place
+            os.chmod(tmp_path, 0o444)
+            try:
+                os.replace(tmp_path, blob)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # The download folder is on another filesystem: copy in, then rename within the store
+                copy = self._copy(tmp_path)
+                os.chmod(copy, 0o444)
+                os.replace(copy, blob)
+                os.remove(tmp_path)
+        if url:
+            with self.lock:
+                self.urls[url] = {
+                    'sha256': sha256,
+                    'size': size if size is not None else os.path.getsize(blob),
+                    'etag': (headers or {}).get('ETag'),
+                    'last_modified': (headers or {}).get('Last-Modified'),
+                }
+                self.dirty = True
+        return blob
+
+    def link(self, sha256, dest):
+        """Point dest at a blob, atomically replacing whatever is there."""
+        blob = self.blob_path(sha256)
+        folder = os.path.dirname(dest) or "."
+        os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, f".{os.path.basename(dest)}.link")
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        mode = self.link_mode
+        if mode == "hard":
+            try:
+                os.link(blob, tmp)
+            except OSError as e:
+                # Another filesystem, or one without hard links
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                    raise
+                mode = "symlink"
+        if mode == "symlink":
+            os.symlink(os.path.abspath(blob), tmp)
+        os.replace(tmp, dest)
+
+    def import_file(self, path):
+        """Copy one existing file into the store (unless its content is there already) and link it back. Returns the bytes freed."""
+        if os.path.islink(path):
+            return 0
+        sha256 = hash_file(path)
+        blob = self.blob_path(sha256)
+        # A first copy is copied in, not hard-linked, so the user's own file is never made read-only
+        new = not os.path.exists(blob)
+        if new:
+            self.add(self._copy(path), sha256)
+        elif os.path.samefile(path, blob):
+            return 0
+        size = os.path.getsize(path)
+        self.link(sha256, path)
+        return 0 if new else size
+
+    def _copy(self, path):
+        fd, tmp = tempfile.mkstemp(prefix=".", suffix=".part", dir=self.root)
+        with os.fdopen(fd, "wb") as out, open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                out.write(chunk)
+        return tmp
+
+    def import_tree(self, folder):
+        """Dedupe every PDF under folder into the store. Returns (files, bytes saved)."""
+        files = saved = 0
+        for root, _, names in os.walk(folder):
+            for name in names:
+                if not name.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    saved += self.import_file(path)
+                    files += 1
+                except Exception as e:
+                    logging.error(f"Could not import {path}: {e}")
+        logging.info(f"Imported {files} files from {folder}, {saved / 1024 / 1024:.1f} MB freed")
+        return files, saved
+
+    def blobs(self):
+        for root, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(".pdf"):
+                    yield os.path.join(root, name)
+
+    def stats(self):
+        count = size = linked = 0
+        for path in self.blobs():
+            st = os.stat(path)
+            count += 1
+            size += st.st_size
+            # Every hard link beyond the blob itself is a copy that was not stored again
+            linked += st.st_size * (st.st_nlink - 1)
+        return {'blobs': count, 'bytes': size, 'bytes_linked': linked, 'urls': len(self.urls)}
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            # Keep what other processes sharing the store have recorded since we loaded
+            try:
+                with open(self.index_path, encoding="utf-8") as f:
+                    on_disk = json.load(f)
+                on_disk.update(self.urls)
+                self.urls = on_disk
+            except Exception:
+                pass
+            fd, tmp_path = tempfile.mkstemp(prefix=".index", suffix=".part", dir=self.root)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.urls, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.index_path)
+            self.dirty = False
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Content-addressed PDF store")
+    parser.add_argument("command", choices=["import", "stats"])
+    parser.add_argument("folders", nargs="*", help="trees to dedupe (import)")
+    parser.add_argument("--store", default=BLOB_DIR)
+    parser.add_argument("--link", choices=["hard", "symlink"], default="hard")
+    args = parser.parse_args()
+
+    store = BlobStore(args.store, link=args.link)
+    if args.command == "import":
+        if not args.folders:
+            sys.exit("import needs at least one folder, e.g. papers_igcse papers_paired papers/mathematics2")
+        total = 0
+        for folder in args.folders:
+            total += store.import_tree(folder)[1]
+        print(f"{total / 1024 / 1024:.1f} MB freed")
+    print(json.dumps(store.stats()))
+    store.save()
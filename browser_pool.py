@@ -0,0 +1,120 @@
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager
+from papers import setup_driver, warm_driver
+from request_filters import collect_selenium, report_selenium
+
+class BrowserPool:
+    """Pre-launched, pre-consented browser sessions that jobs check out and return.
+
+    Drivers are started and warmed (page loaded, cookies accepted) on
+    background threads, so a job only waits for Chrome if none is ready yet.
+    With prelaunch=False nothing starts until the first checkout, after
+    which returned drivers stay warm for the next job.
+    """
+
+    def __init__(self, size=1, factory=setup_driver, prelaunch=True, timeout=180):
+        self.size = size
+        self.factory = factory
+        self.timeout = timeout
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+        self.drivers = []
+        self.launching = 0
+        self.closed = False
+        if prelaunch:
+            for _ in range(size):
+                self._spawn()
+
+    def _spawn(self):
+        with self.lock:
+            if len(self.drivers) + self.launching >= self.size:
+                return
+            self.launching += 1
+        threading.Thread(target=self._launch, name="browser-launch", daemon=True).start()
+
+    def _launch(self):
+        start = time.perf_counter()
+        driver = None
+        try:
+            driver = self.factory()
+            warm_driver(driver)
+            with self.lock:
+                self.launching -= 1
+                if not self.closed:
+                    self.drivers.append(driver)
+            if self.closed:
+                try: driver.quit()
+                except: pass
+                return
+            logging.info(f"Browser ready in {time.perf_counter() - start:.1f}s")
+            self.idle.put(driver)
+        except Exception as e:
+            logging.error(f"Failed to launch pooled browser: {e}")
+            if driver is not None:
+                try: driver.quit()
+                except: pass
+            with self.lock:
+                self.launching -= 1
+            self.idle.put(e)
+
+    def _alive(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, driver):
+        with self.lock:
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+        report_selenium(driver)
+        try: driver.quit()
+        except: pass
+
+    def checkout(self):
+        if self.idle.empty():
+            self._spawn()
+        item = self.idle.get(timeout=self.timeout)
+        if isinstance(item, Exception):
+            raise item
+        if not self._alive(item):
+            logging.warning("Pooled browser died; launching a replacement")
+            self._discard(item)
+            return self.checkout()
+        return item
+
+    def checkin(self, driver):
+        if self.closed or not self._alive(driver):
+            self._discard(driver)
+            return
+        # Drain the performance log so it does not grow while the driver idles
+        collect_selenium(driver)
+        self.idle.put(driver)
+
+    def retire(self, driver):
+        """Quit a checked-out driver for good and start warming its replacement."""
+        self._discard(driver)
+        if not self.closed:
+            self._spawn()
+
+    @contextmanager
+    def driver(self):
+        d = self.checkout()
+        try:
+            yield d
+        finally:
+            self.checkin(d)
+
+    def close(self):
+        self.closed = True
+        with self.lock:
+            drivers = list(self.drivers)
+            self.drivers = []
+        for d in drivers:
+            report_selenium(d)
+            try: d.quit()
+            except: pass
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from classifier import classify
+
+CATALOG_PATH = "catalog.db"
+
+# status: discovered -> queued -> downloaded / unchanged / failed; gone once a re-crawl no longer lists it
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    job TEXT,
+    backend TEXT,
+    started REAL,
+    finished REAL,
+    documents INTEGER,
+    new INTEGER
+);
+CREATE TABLE IF NOT EXISTS documents (
+    url TEXT NOT NULL,
+    qualification TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    spec TEXT,
+    series TEXT NOT NULL,
+    title TEXT,
+    code TEXT,
+    number TEXT,
+    kind TEXT,
+    status TEXT NOT NULL DEFAULT 'discovered',
+    path TEXT,
+    size INTEGER,
+    sha256 TEXT,
+    first_seen REAL,
+    last_seen REAL,
+    first_run INTEGER,
+    last_run INTEGER,
+    downloaded_at REAL,
+    PRIMARY KEY (url, qualification, subject, series)
+);
+CREATE TABLE IF NOT EXISTS files (
+    url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    size INTEGER,
+    sha256 TEXT,
+    queued_at REAL,
+    downloaded_at REAL,
+    PRIMARY KEY (url, path)
+);
+CREATE INDEX IF NOT EXISTS documents_url ON documents (url);
+CREATE INDEX IF NOT EXISTS documents_series ON documents (qualification, subject, series);
+CREATE INDEX IF NOT EXISTS documents_code ON documents (qualification, subject, series, code, kind);
+CREATE INDEX IF NOT EXISTS documents_first_run ON documents (first_run);
+CREATE INDEX IF NOT EXISTS documents_status ON documents (status);
+CREATE INDEX IF NOT EXISTS files_path ON files (path);
+"""
+
+class Catalog:
+    """SQLite catalog of every discovered document and what became of it.
+
+    documents has one row per listing (a PDF listed under two series is two
+    rows) and files one row per copy written (url and path), so the copies
+    two jobs write of one PDF are tracked apart. A crawl diffs each series
+    against it (diff_series), and a DownloadEngine given the catalog as its
+    listener records queueing and download results. The query helpers answer "what
+    do we hold" without walking the output folders.
+    """
+
+    def __init__(self, path=CATALOG_PATH, commit_every=50):
+        self.path = path
+        self.commit_every = commit_every
+        self.pending = 0
+        self.lock = threading.Lock()
+        # Download workers report from their own threads; every use goes through self.lock
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def _changed(self, n=1):
+        self.pending += n
+        if self.pending >= self.commit_every:
+            self.db.commit()
+            self.pending = 0
+
+    def flush(self):
+        """Commit what is pending, so other processes writing to the catalog are not kept waiting."""
+        with self.lock:
+            if self.pending:
+                self.db.commit()
+                self.pending = 0
+
+    def start_run(self, job, backend):
+        with self.lock:
+            cur = self.db.execute("INSERT INTO runs (job, backend, started) VALUES (?, ?, ?)", (job, backend, time.time()))
+            self.db.commit()
+            return cur.lastrowid
+
+    def finish_run(self, run_id):
+        with self.lock:
+            self.db.execute("""UPDATE runs SET finished = ?,
+                                   documents = (SELECT COUNT(*) FROM documents WHERE last_run = ?),
+                                   new = (SELECT COUNT(*) FROM documents WHERE first_run = ?)
+                               WHERE id = ?""", (time.time(), run_id, run_id, run_id))
+            self.db.commit()
+            self.pending = 0
+
+    def diff_series(self, run_id, qualification, subject, spec, series, results):
+        """Record one series' result rows and compare them with what the catalog held for that series.
+
+        Returns {'new': [rows not listed there before], 'known': n, 'gone': n}.
+        Whether the series still needs downloads is up to each job's manifest.
+        """
+        now = time.time()
+        key = (qualification, subject, series)
+        with self.lock:
+            known = {r['url'] for r in self.db.execute(
+                "SELECT url FROM documents WHERE qualification = ? AND subject = ? AND series = ?", key)}
+            new = [r for r in results if r['href'] not in known]
+            for r in new:
+                info = classify(r['title'])
+                self.db.execute("""INSERT OR IGNORE INTO documents
+                                   (url, qualification, subject, spec, series, title, code, number, kind, first_seen, last_seen, first_run, last_run)
+                                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                (r['href'], qualification, subject, spec, series, r['title'], info.code, info.number, info.kind,
+                                 now, now, run_id, run_id))
+            listed = {r['href'] for r in results if r['href'] in known}
+            self.db.executemany("""UPDATE documents SET last_seen = ?, last_run = ?, status = CASE status WHEN 'gone' THEN 'discovered' ELSE status END
+                                   WHERE url = ? AND qualification = ? AND subject = ? AND series = ?""",
+                                [(now, run_id, url) + key for url in listed])
+            gone = known - listed
+            self.db.executemany("UPDATE documents SET status = 'gone' WHERE url = ? AND qualification = ? AND subject = ? AND series = ?",
+                                [(url,) + key for url in gone])
+            self._changed(len(results) + len(gone))
+        return {'new': new, 'known': len(listed), 'gone': len(gone)}
+
+    # DownloadEngine listener
+    def queued(self, url, filepath):
+        with self.lock:
+            self.db.execute("UPDATE documents SET status = 'queued', path = ? WHERE url = ?", (filepath, url))
+            self.db.execute("""INSERT INTO files (url, path, status, queued_at) VALUES (?, ?, 'queued', ?)
+                               ON CONFLICT (url, path) DO UPDATE SET status = 'queued', queued_at = excluded.queued_at""",
+                            (url, filepath, time.time()))
+            self._changed()
+
+    def finished(self, url, filepath, result):
+        with self.lock:
+            if result is None:
+                self.db.execute("UPDATE documents SET status = 'failed' WHERE url = ?", (url,))
+                self.db.execute("UPDATE files SET status = 'failed' WHERE url = ? AND path = ?", (url, filepath))
+            else:
+                status = "downloaded" if result['status'] == "downloaded" else "unchanged"
+                now = time.time()
+                self.db.execute("UPDATE documents SET status = ?, path = ?, size = ?, sha256 = ?, downloaded_at = ? WHERE url = ?",
+                                (status, filepath, result['size'], result['sha256'], now, url))
+                self.db.execute("UPDATE files SET status = ?, size = ?, sha256 = ?, downloaded_at = ? WHERE url = ? AND path = ?",
+                                (status, result['size'], result['sha256'], now, url, filepath))
+            self._changed()
+
+    def close(self):
+        with self.lock:
+            self.db.commit()
+            self.db.close()
+
+    # Queries
+    def _rows(self, sql, args=()):
+        with self.lock:
+            return [dict(r) for r in self.db.execute(sql, args)]
+
+    def last_run(self):
+        rows = self._rows("SELECT * FROM runs WHERE finished IS NOT NULL ORDER BY id DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    def new_documents(self, run_id=None):
+        """Documents first seen in run_id (default: the last finished run)."""
+        if run_id is None:
+            last = self.last_run()
+            if last is None:
+                return []
+            run_id = last['id']
+        return self._rows("SELECT * FROM documents WHERE first_run = ? ORDER BY qualification, subject, series, code", (run_id,))
+
+    def missing_pair(self, kind="ms"):
+        """Documents of kind whose counterpart (QP for an MS, MS for a QP) is not listed in the same series."""
+        other = "qp" if kind == "ms" else "ms"
+        return self._rows("""SELECT d.* FROM documents d
+                             WHERE d.kind = ? AND d.status != 'gone' AND NOT EXISTS (
+                                 SELECT 1 FROM documents o
+                                 WHERE o.qualification = d.qualification AND o.subject = d.subject AND o.series = d.series
+                                   AND o.code IS d.code AND o.kind = ? AND o.status != 'gone')
+                             ORDER BY d.qualification, d.subject, d.series, d.code""", (kind, other))
+
+    def by_status(self, status):
+        return self._rows("SELECT * FROM documents WHERE status = ? ORDER BY qualification, subject, series, code", (status,))
+
+    def runs(self):
+        return self._rows("SELECT * FROM runs ORDER BY id")
+
+    def summary(self):
+        return self._rows("""SELECT qualification, subject, COUNT(DISTINCT series) AS series, COUNT(*) AS documents,
+                                    SUM(status IN ('downloaded', 'unchanged')) AS held, SUM(status = 'failed') AS failed,
+                                    SUM(COALESCE(size, 0)) AS bytes
+                             FROM documents WHERE status != 'gone'
+                             GROUP BY qualification, subject ORDER BY qualification, subject""")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="Query the document catalog; rows are printed as JSON Lines")
+    parser.add_argument("query", choices=["summary", "new", "ms-missing-qp", "qp-missing-ms", "failed", "runs"])
+    parser.add_argument("--catalog", default=CATALOG_PATH)
+    parser.add_argument("--run", type=int, help="run id for 'new' (default: the last finished run)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.catalog):
+        sys.exit(f"No catalog at {args.catalog}")
+    catalog = Catalog(args.catalog)
+    started = time.perf_counter()
+    if args.query == "summary":
+        rows = catalog.summary()
+    elif args.query == "new":
+        rows = catalog.new_documents(args.run)
+    elif args.query == "ms-missing-qp":
+        rows = catalog.missing_pair("ms")
+    elif args.query == "qp-missing-ms":
+        rows = catalog.missing_pair("qp")
+    elif args.query == "failed":
+        rows = catalog.by_status("failed")
+    else:
+        rows = catalog.runs()
+    for row in rows:
+        sys.stdout.write(json.dumps(row) + "\n")
+    logging.info(f"{len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+    catalog.close()
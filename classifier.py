@@ -0,0 +1,160 @@
+import re
+import time
+import logging
+import argparse
+from functools import lru_cache
+
+# Titles look like "Question paper - Paper 1F (4MA1/1F) - June 2019 (PDF | 1.2 MB)"
+SIZE_RE = re.compile(r'\(PDF.*?\)', re.IGNORECASE)
+# A paper code has letters and digits (4MA1, 9MA0, WMA11), optionally followed by /01, -1F, /1FR1
+CODE_RE = re.compile(r'\b(?=[A-Z0-9]*[A-Z])(?=[A-Z0-9]*[0-9])[A-Z0-9]{4,}(?:[-/][A-Z0-9]+)?\b')
+# The number must start with a digit, so "paper and mark scheme" is not paper "and"
+PAPER_RE = re.compile(r'\bPaper\s*(\d[A-Z0-9]*)\b', re.IGNORECASE)
+RESIT_RE = re.compile(r'\b(\d+R)\b')
+# Matched against the lower-cased title, whole words only: a bare "ms" / "qp" substring also matches "Systems", "forms", ...
+QP_RE = re.compile(r'\b(?:question paper|qp)\b')
+MS_RE = re.compile(r'\b(?:mark(?:ing)? scheme|ms)\b')
+TIER_RE = re.compile(r'\b(foundation|higher)\b')
+NUMBER_TIER_RE = re.compile(r'^\d+([FH])')
+TYPE_PREFIX_RE = re.compile(r'^(Question paper|Marking scheme|Mark scheme|QP|MS)\s*[-:]*\s*', re.IGNORECASE)
+TYPE_SUFFIX_RE = re.compile(r'\s*[-:]*\s*(Question paper|Marking scheme|Mark scheme|QP|MS)$', re.IGNORECASE)
+
+class PaperTitle:
+    """What a result title says about its document.
+
+    code is the paper code with "/" replaced by "-" (e.g. 4MA1-1F), number the
+    paper number (1F, 01), resit the resit marker (1R) or None, kind "qp",
+    "ms" or None, and tier "F", "H" or None. Records are shared between equal
+    titles, so treat them as read-only.
+    """
+
+    __slots__ = ("title", "clean", "code", "number", "resit", "kind", "tier")
+
+    def __init__(self, title, clean, code, number, resit, kind, tier):
+        self.title = title
+        self.clean = clean
+        self.code = code
+        self.number = number
+        self.resit = resit
+        self.kind = kind
+        self.tier = tier
+
+    def __repr__(self):
+        return f"PaperTitle({self.clean!r}, code={self.code}, number={self.number}, resit={self.resit}, kind={self.kind}, tier={self.tier})"
+
+    def subject_name(self):
+        """The title without its document type, e.g. "Paper 1 (9MA0/01) - June 2019"."""
+        name = TYPE_PREFIX_RE.sub('', self.clean).strip()
+        return TYPE_SUFFIX_RE.sub('', name).strip()
+
+# Large enough for a full backfill's distinct titles
+@lru_cache(maxsize=1 << 17)
+def classify(title):
+    """Classify one result title. Memoized, since the same titles come back every run and in every backend."""
+    clean = SIZE_RE.sub('', title) if '(' in title else title
+    clean = " ".join(clean.split())
+    lower = clean.lower()
+
+    code_match = CODE_RE.search(clean)
+    code = code_match.group(0).replace('/', '-') if code_match else None
+    paper_match = PAPER_RE.search(clean)
+    number = paper_match.group(1).upper() if paper_match else None
+    if not number and code and '-' in code:
+        # Use the last part of the code if the paper number is missing
+        number = code.split('-')[-1]
+    # Skip the regex for the (common) titles without a capital R at all
+    resit_match = RESIT_RE.search(title) if 'R' in title else None
+
+    if QP_RE.search(lower):
+        kind = "qp"
+    elif MS_RE.search(lower):
+        kind = "ms"
+    else:
+        kind = None
+
+    tier = None
+    tier_match = NUMBER_TIER_RE.match(number) if number else None
+    if tier_match:
+        tier = tier_match.group(1)
+    else:
+        tier_match = TIER_RE.search(lower)
+        if tier_match:
+            tier = tier_match.group(1)[0].upper()
+    return PaperTitle(title, clean, code, number, resit_match.group(1) if resit_match else None, kind, tier)
+
+def classify_all(titles):
+    """Classify a batch of titles; repeated titles are only parsed once."""
+    return [classify(t) for t in titles]
+
+def corpus(size=100000, seed=1):
+    """Realistic titles for the benchmark: the simulator's catalogue with the site's size labels and extra documents."""
+    import random
+    import simulator
+
+    rng = random.Random(seed)
+    site = simulator.Site(scale=size)
+    titles = []
+    for docs in site.documents.values():
+        for d in docs:
+            title = d['title']
+            if rng.random() < 0.5:
+                title += f" (PDF | {rng.randint(100, 4000) / 1000:.1f} MB)"
+            titles.append(title)
+            if rng.random() < 0.05:
+                titles.append(title.replace(d['type'], "Examiner report"))
+    return titles[:size]
+
+def _legacy(title):
+    # The per-row parsing the scrapers used to do, kept only as the benchmark baseline
+    clean = re.sub(r'\(PDF.*?\)', '', title, flags=re.IGNORECASE).strip()
+    code_match = re.search(r'([A-Z0-9]{4,}[-/][A-Z0-9]+)', clean)
+    code = code_match.group(1).replace('/', '-') if code_match else None
+    number_match = re.search(r'Paper\s*([A-Z0-9]+)', clean, re.IGNORECASE)
+    re.search(r'\b(\d+R)\b', title)
+    lower = title.lower()
+    if any(term in lower for term in ["question paper", "qp"]):
+        kind = "qp"
+    elif any(term in lower for term in ["marking scheme", "mark scheme", "ms"]):
+        kind = "ms"
+    else:
+        kind = None
+    return code, number_match.group(1) if number_match else None, kind
+
+def benchmark(size=100000, passes=3):
+    titles = corpus(size)
+    rows = []
+
+    started = time.perf_counter()
+    for _ in range(passes):
+        legacy = [_legacy(t) for t in titles]
+    rows.append(("per-row re calls", (time.perf_counter() - started) / passes))
+
+    classify.cache_clear()
+    started = time.perf_counter()
+    classify_all(titles)
+    rows.append(("classify_all, cold cache", time.perf_counter() - started))
+
+    started = time.perf_counter()
+    for _ in range(passes):
+        records = classify_all(titles)
+    rows.append(("classify_all, warm cache", (time.perf_counter() - started) / passes))
+
+    # Titles where whole-word matching gives a different document type than the substring test
+    differ = sum(1 for old, new in zip(legacy, records) if old[2] != new.kind)
+    print(f"{len(titles)} titles, {len(set(titles))} distinct")
+    for name, seconds in rows:
+        print(f"{name:<26} {seconds * 1000:9.1f} ms  {seconds / len(titles) * 1e6:6.2f} us/title")
+    print(f"document type differs from the substring test on {differ} titles")
+    return rows
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Classify paper titles, or benchmark the classifier")
+    parser.add_argument("titles", nargs="*", help="titles to classify")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="time N titles from the simulator catalogue")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    for record in classify_all(args.titles):
+        print(record)
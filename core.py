@@ -0,0 +1,428 @@
+import os
+import time
+import logging
+from itertools import groupby
+from downloader import DownloadEngine, remove_partial_downloads
+from manifest import Manifest
+from papers import waits, _series_predicate
+from backends import make_backend
+from classifier import classify_all
+from catalog import Catalog, CATALOG_PATH
+from blobstore import BlobStore, BLOB_DIR
+from memory import MemoryGuard
+from ratelimit import Throttle
+from transport import make_session
+from fulltext import index_tree, require_extractor
+from artifacts import ArtifactRecorder
+from jobspec import load_jobs, plan
+from workqueue import WorkQueue, Heartbeat, owner_name, LEASE_SECONDS
+import metrics
+
+# Jobs the scrapers run, declared in jobs.json (see jobspec.py). layout decides how a series' documents are grouped into folders:
+#   "qp"      - question papers only, flat in dest (scraper.py)
+#   "by_code" - dest/<title (code)>/{paper,marking_scheme} (scraper_with_ms.py)
+#   "paired"  - dest/<subject>/<series>/Paper N/{paper,marking_scheme} (scraper_igcse.py)
+# limit stops after that many matching series per subject, in page order (newest first).
+JOBS = load_jobs()
+
+def safe_name(text, extra=""):
+    return "".join([c for c in text if c.isalnum() or c in (' ', '-', '_') or c in extra]).strip()
+
+def pair_results(results, code_prefix=None):
+    """Group result rows ({'href', 'title'}) by paper number into QP / MS lists.
+
+    A title without a full paper code gets code_prefix-number as its code
+    (e.g. 4MA1-1F), or just the paper number without a prefix.
+    """
+    paired_data = {}
+    for item, info in zip(results, classify_all([r['title'] for r in results])):
+        paper_num = info.number or "Unknown"
+        paper_code = info.code if info.code and '-' in info.code else None
+        if not paper_code:
+            paper_code = f"{code_prefix}-{paper_num}" if code_prefix else paper_num
+
+        if paper_num not in paired_data:
+            paired_data[paper_num] = {'qp': [], 'ms': [], 'code': paper_code}
+        if info.kind:
+            paired_data[paper_num][info.kind].append({'href': item['href'], 'title': item['title'], 'resit': info.resit})
+    return paired_data
+
+def paired_files(base_folder, target_subject, series_name, paired_data):
+    files = []
+    for p_num, info in paired_data.items():
+        # Rel path: Subject -> Series -> Paper Number -> paper/marking_scheme
+        rel_path = os.path.join(base_folder, target_subject, series_name, f"Paper {p_num}")
+
+        for kind, folder, label in (("qp", "paper", "Question_Paper"), ("ms", "marking_scheme", "Marking_Scheme")):
+            for i, item in enumerate(info[kind]):
+                suffix = f"_{i+1}" if len(info[kind]) > 1 else ""
+                r_suffix = f"_{item['resit']}" if item.get('resit') else ""
+                fname = f"{label}_{info['code']}{r_suffix}{suffix}.pdf"
+                files.append((item['href'], os.path.join(rel_path, folder, fname)))
+    return files
+
+def pair_by_code(results):
+    """Group result rows by paper code (e.g. 9MA0/01, WMA11/01) into one QP / MS per folder."""
+    paired_data = {} # { paper_code: { 'qp': href, 'ms': href, 'folder': name } }
+    for item, info in zip(results, classify_all([r['title'] for r in results])):
+        # Fallback if no code: use a truncated name
+        paper_code = info.code or info.clean[:30].replace(' ', '_')
+        subject_name = info.subject_name()
+        folder_name = f"{subject_name} ({paper_code})" if paper_code not in subject_name else subject_name
+
+        if paper_code not in paired_data:
+            paired_data[paper_code] = {'qp': None, 'ms': None, 'folder': folder_name}
+        if info.kind:
+            paired_data[paper_code][info.kind] = item['href']
+    return {k: v for k, v in paired_data.items() if v['qp'] or v['ms']}
+
+def by_code_files(base_dir, paired_data):
+    files = []
+    for paper_id, data in paired_data.items():
+        folder_name = safe_name(data['folder'], "()")
+        paper_path = os.path.join(base_dir, folder_name)
+        if data['qp']:
+            qp_filename = os.path.basename(data['qp']).split('?')[0]
+            files.append((data['qp'], os.path.join(paper_path, "paper", qp_filename)))
+        if data['ms']:
+            ms_filename = os.path.basename(data['ms']).split('?')[0]
+            files.append((data['ms'], os.path.join(paper_path, "marking_scheme", ms_filename)))
+        else:
+            logging.warning(f"No Marking Scheme found for {folder_name}")
+    return files
+
+def question_paper_files(download_dir, results):
+    files = []
+    for item, info in zip(results, classify_all([r['title'] for r in results])):
+        if info.kind == "qp":
+            filename = safe_name(f"{item['title'][:50]}.pdf", ".")
+            logging.info(f"Queueing: {filename} from {item['href']}")
+            files.append((item['href'], os.path.join(download_dir, filename)))
+    return files
+
+def series_files(job, subject, series_name, results):
+    """Every (url, path) the job would download for one series' result rows, laid out by its layout."""
+    dest = job['dest']
+    if job.get('kinds'):
+        results = [r for r, info in zip(results, classify_all([r['title'] for r in results])) if info.kind in job['kinds']]
+    if job['layout'] == "qp":
+        return question_paper_files(dest, results)
+    if job['layout'] == "by_code":
+        paired_data = pair_by_code(results)
+        logging.info(f"Grouped into {len(paired_data)} paper entries.")
+        return by_code_files(dest, paired_data)
+    paired_data = pair_results(results, (job.get('code_prefixes') or {}).get(subject))
+    logging.info(f"Paired {len(paired_data)} papers for {series_name}: {list(paired_data.keys())}")
+    return paired_files(dest, subject, series_name, paired_data)
+
+def queue_series(engine, files):
+    """Queue a series' files (from series_files) on engine. Returns how many were queued."""
+    for url, path in files:
+        engine.submit(url, path)
+    return len(files)
+
+def run_job(job, backend, engine=None, session=None, catalog=None, run_id=None, guard=None):
+    """Discover one job's documents through backend and queue each series on engine as soon as it is read (see run_plan)."""
+    engines = {job['dest']: engine} if engine is not None else None
+    return run_plan(plan([job]), backend, engines, session=session, catalog=catalog, run_id=run_id, guard=guard)
+
+def run_plan(steps, backend, engines=None, session=None, catalog=None, run_id=None, guard=None):
+    """Walk a navigation plan (jobspec.plan) and queue each series on its jobs' engines as soon as it is read.
+
+    engines maps each job's dest to its DownloadEngine; without them the
+    documents are only discovered (used by the benchmark). A subject is read
+    once for all the jobs of its step, and the backend is only asked for a
+    series some job still wants (its filter accepts it and its limit is not
+    reached), so unwanted series are never opened. With a catalog each
+    series is diffed against it first. Each job queues only the files its
+    folder's manifest does not hold fresh (Manifest.is_fresh). With a
+    MemoryGuard the browser is recycled when it says so, and the subject is
+    reopened at the first series not yet done.
+    """
+    stats = {'series': 0, 'documents': 0, 'queued': 0, 'new': 0, 'series_skipped': 0, 'recycles': 0, 'series_seconds': []}
+    for step in steps:
+        qualification, subject, spec, jobs = step['qualification'], step['subject'], step['spec'], step['jobs']
+        logging.info(f"--- Processing {subject} for {', '.join(j.get('name', j['dest']) for j in jobs)} ---")
+        predicates = [_series_predicate(job.get('series')) for job in jobs]
+        taken = [set() for _ in jobs]
+
+        def wanted(name):
+            return [i for i, job in enumerate(jobs)
+                    if predicates[i](name) and not (job.get('limit') and len(taken[i]) >= job['limit'])]
+        done = set()
+        finished = False
+        while not finished:
+            finished = True
+            docs = backend.documents(qualification, subject, spec=spec,
+                                     series_filter=lambda s: s not in done and bool(wanted(s)))
+            mark = time.perf_counter()
+            for series_name, series_docs in groupby(docs, key=lambda d: d.series):
+                results = [{'href': d.href, 'title': d.title} for d in series_docs]
+                # Time to reach and read this series, including navigation from the previous one
+                stats['series_seconds'].append(round(time.perf_counter() - mark, 4))
+                stats['series'] += 1
+                stats['documents'] += len(results)
+                diff = None
+                if catalog is not None:
+                    diff = catalog.diff_series(run_id, qualification, subject, spec, series_name, results)
+                    stats['new'] += len(diff['new'])
+                    logging.info(f"{series_name}: {len(diff['new'])} new, {diff['known']} known, {diff['gone']} no longer listed")
+                consumers = wanted(series_name)
+                if engines:
+                    # Each job is judged by its own folder; files its manifest confirmed recently need no request,
+                    # the rest are queued and the engine revalidates them with a conditional GET
+                    files = {}
+                    for i in consumers:
+                        manifest = engines[jobs[i]['dest']].manifest
+                        job_files = [(url, path) for url, path in series_files(jobs[i], subject, series_name, results)
+                                     if manifest is None or not manifest.is_fresh(path, url)]
+                        if job_files:
+                            files[i] = job_files
+                        else:
+                            logging.info(f"{series_name}: every file in {jobs[i]['dest']} is fresh; skipping downloads")
+                    if not files:
+                        stats['series_skipped'] += 1
+                    else:
+                        # Refresh download cookies from the backend before queueing
+                        backend.prepare_session(session or next(iter(engines.values())).session)
+                        for i, job_files in files.items():
+                            stats['queued'] += queue_series(engines[jobs[i]['dest']], job_files)
+                for i in consumers:
+                    taken[i].add(series_name)
+                done.add(series_name)
+                if all(job.get('limit') and len(taken[i]) >= job['limit'] for i, job in enumerate(jobs)):
+                    docs.close()
+                    break
+                reason = guard.check() if guard is not None else None
+                if reason:
+                    docs.close()
+                    guard.recycled(reason)
+                    with metrics.span("recycle"):
+                        backend.recycle()
+                    stats['recycles'] += 1
+                    finished = False
+                    break
+                mark = time.perf_counter()
+    return stats
+
+def list_series(backend, qualification, subject, spec=None, series_filter=None):
+    """Names of a subject's series that pass series_filter, in page order, without opening any of them.
+
+    Every backend asks its series filter about each series before reading
+    it, so a filter that records the name and says no lists them all.
+    """
+    predicate = _series_predicate(series_filter)
+    names = []
+
+    def collect(name):
+        if predicate(name) and name not in names:
+            names.append(name)
+        return False
+    for _ in backend.documents(qualification, subject, spec=spec, series_filter=collect):
+        pass
+    return names
+
+def run_units(queue, name, job, backend, engine=None, catalog=None, run_id=None, guard=None,
+              owner=None, lease=LEASE_SECONDS, network=False, poll=5):
+    """Claim and work a job's units from a workqueue.WorkQueue until none are left.
+
+    A listing unit adds one unit per series of its subject (the first
+    job['limit'] of them, if set). A series unit runs run_job for that one
+    series and waits for its downloads, so the unit is only done once its
+    files are on disk; failed downloads give it back to the queue. The
+    lease is renewed by a Heartbeat while the unit is worked on.
+    """
+    owner = owner or owner_name()
+    stats = {'units': 0, 'units_failed': 0, 'leases_lost': 0, 'series': 0, 'documents': 0, 'queued': 0, 'new': 0,
+             'series_skipped': 0, 'recycles': 0, 'series_seconds': []}
+    while True:
+        unit = queue.claim(owner, lease, job=name)
+        if unit is None:
+            # Units leased by other workers may still expire, or a listing unit may add more
+            if queue.outstanding(name) == 0:
+                break
+            time.sleep(poll)
+            continue
+        label = f"{unit['subject']} / {unit['series'] or 'series list'}"
+        logging.info(f"--- Unit {unit['id']}: {label} (attempt {unit['attempts']}) ---")
+        beat = Heartbeat(queue.path, unit['id'], owner, lease, network=network)
+        try:
+            if not unit['series']:
+                names = list_series(backend, unit['qualification'], unit['subject'], unit['spec'] or None, job.get('series'))
+                if job.get('limit'):
+                    names = names[:job['limit']]
+                added = sum(queue.add(name, unit['qualification'], unit['subject'], unit['spec'], s) for s in names)
+                logging.info(f"{unit['subject']}: {len(names)} series, {added} new units")
+                result = {'series': names}
+            else:
+                failed_before = len(engine.failures) if engine is not None else 0
+                one = dict(job, subjects=[unit['subject']], series=lambda s, want=unit['series']: s == want, limit=1)
+                part = run_job(one, backend, engine, catalog=catalog, run_id=run_id, guard=guard)
+                if part['series'] == 0:
+                    raise RuntimeError(f"series {unit['series']!r} is no longer listed")
+                if engine is not None:
+                    engine.flush()
+                    failures = engine.failures[failed_before:]
+                    if failures:
+                        raise RuntimeError(f"{len(failures)} downloads failed, e.g. {failures[0][0]}")
+                for k, v in part.items():
+                    stats[k] += v
+                result = {k: v for k, v in part.items() if k != 'series_seconds'}
+        except Exception as e:
+            logging.error(f"Unit {unit['id']} ({label}) failed: {e}")
+            queue.fail(unit['id'], owner, e)
+            stats['units_failed'] += 1
+        else:
+            if queue.complete(unit['id'], owner, result):
+                stats['units'] += 1
+            else:
+                stats['leases_lost'] += 1
+        finally:
+            beat.stop()
+            # Other workers write to the same catalog; an open transaction would lock them out while we wait
+            if catalog is not None:
+                catalog.flush()
+    return stats
+
+def run(job, backend="selenium", workers=4, filter_profile="minimal", headless=True, dest=None,
+        discover_only=False, waits_path=None, metrics_interval=30, catalog_path=CATALOG_PATH,
+        store_path=BLOB_DIR, low_memory=False, recycle_every=None, memory_ceiling_mb=None, trace=False,
+        artifact_steps=20, transport="requests", index_path=None, queue_path=None, lease=LEASE_SECONDS, network=False):
+    """Run a job end to end: start the backend, discover, download, and return the run's counters.
+
+    job is a name from JOBS, a job dict, or a list of either; a list is
+    compiled into one navigation plan (jobspec.plan) so subjects the jobs
+    share are read once.
+
+    Every stage is timed as a span; the run report goes to runs/<job>-<time>.json
+    and a Prometheus snapshot to runs/metrics.prom, refreshed every metrics_interval seconds.
+    Discovered documents and download results are kept in the catalog at
+    catalog_path (None to run without one). Files are stored once under
+    store_path and linked into the job's folders (None to write plain files).
+
+    low_memory starts the browser with LOW_MEMORY_ARGS and samples memory
+    throughout; with it, recycle_every and memory_ceiling_mb recycle the
+    browser after that many series or once its processes exceed the ceiling.
+
+    All HTTP goes through one ratelimit.Throttle, which paces each host,
+    retries 429/5xx and adapts concurrency; stats['http'] has its final state.
+    Downloads use the given transport (see transport.py; "httpx" for HTTP/2).
+    With index_path, the job's folder is then added to that full-text index
+    (fulltext.py); only new or changed PDFs are extracted.
+
+    The last artifact_steps browser steps are kept in memory and written to
+    runs/artifacts/<run>/ only when a step fails, with a screenshot and the
+    widget's HTML of the failing step; trace captures both at every step.
+
+    With queue_path the job's units are claimed from that workqueue.WorkQueue
+    instead of being crawled in order (see run_units); any number of
+    processes, on one machine or several, can run the same job this way.
+    """
+    if isinstance(job, list):
+        jobs = [JOBS[j] if isinstance(j, str) else j for j in job]
+        name = "+".join(j.get('name', os.path.basename(j['dest'])) for j in jobs)
+    else:
+        name = job if isinstance(job, str) else os.path.basename(job['dest'])
+        jobs = [JOBS[job] if isinstance(job, str) else job]
+    if dest:
+        if len(jobs) > 1:
+            raise ValueError("dest can only replace the folder of a single job")
+        jobs = [dict(jobs[0], dest=dest)]
+    if queue_path and len(jobs) > 1:
+        raise ValueError("A work queue runs one job at a time")
+    dests = list(dict.fromkeys(j['dest'] for j in jobs))
+    if index_path and not discover_only:
+        # Before the crawl, not after it: the index stage cannot run without an extractor
+        require_extractor()
+    report_path = metrics.start_run(name, backend=backend, workers=workers, filter=filter_profile, dest=", ".join(dests))
+    exporter = metrics.Exporter(interval=metrics_interval)
+    guard = None
+    if low_memory or recycle_every or memory_ceiling_mb:
+        guard = MemoryGuard(every_series=recycle_every, ceiling_mb=memory_ceiling_mb)
+        metrics.recorder.gauge_sources.append(guard.gauges)
+    # Shared by the downloads and, for the HTTP backend, the widget endpoints
+    throttle = Throttle(concurrency=min(workers, 4), max_concurrency=max(workers, 4))
+    metrics.recorder.gauge_sources.append(throttle.gauges)
+    artifacts = ArtifactRecorder(size=artifact_steps, trace=trace) if backend != "http" else None
+    started = time.perf_counter()
+
+    nav = None
+    engines = {}
+    catalog = Catalog(catalog_path) if catalog_path else None
+    run_id = catalog.start_run(name, backend) if catalog else None
+    stats = {'backend': backend, 'transport': transport, 'job': ", ".join(dests), 'stages': {}}
+    try:
+        # A Selenium browser starts warming up in the background while everything else is set up
+        with metrics.span("startup", backend=backend):
+            nav = make_backend(backend, filter_profile=filter_profile, headless=headless, low_memory=low_memory,
+                               artifacts=artifacts, throttle=throttle, transport=transport)
+        stats['stages']['startup'] = time.perf_counter() - started
+        if not discover_only:
+            # Downloads run in the background while documents are still being discovered
+            session = make_session(transport, pool_size=workers)
+            store = BlobStore(store_path) if store_path else None
+            # One engine per output folder, each with its own manifest; the session, store and throttle are shared
+            for folder in dests:
+                os.makedirs(folder, exist_ok=True)
+                remove_partial_downloads(folder)
+                engines[folder] = DownloadEngine(session, workers=workers, manifest=Manifest(folder), listener=catalog,
+                                                 store=store, throttle=throttle)
+        mark = time.perf_counter()
+        with metrics.span("discover"):
+            if queue_path:
+                queue = WorkQueue(queue_path, network=network)
+                try:
+                    stats.update(run_units(queue, name, jobs[0], nav, engines.get(dests[0]), catalog=catalog, run_id=run_id,
+                                           guard=guard, lease=lease, network=network))
+                finally:
+                    queue.close()
+            else:
+                steps = plan(jobs)
+                stats['steps'] = len(steps)
+                stats.update(run_plan(steps, nav, engines or None, catalog=catalog, run_id=run_id, guard=guard))
+        stats['stages']['discover'] = time.perf_counter() - mark
+    except Exception as e:
+        logging.error(f"Critical error: {e}")
+        stats['error'] = str(e)
+    finally:
+        # nav is unset when the backend itself failed to start
+        if nav is not None:
+            stats['page_bytes'] = nav.bytes_transferred()
+            nav.close()
+        if engines:
+            # Whatever is still queued once discovery ends
+            mark = time.perf_counter()
+            with metrics.span("drain"):
+                for engine in engines.values():
+                    engine.close()
+            session.close()
+            stats['stages']['drain'] = time.perf_counter() - mark
+            stats.update({'downloaded': sum(e.ok for e in engines.values()), 'unchanged': sum(e.skipped for e in engines.values()),
+                          'failed': sum(e.failed for e in engines.values()), 'download_bytes': sum(e.bytes for e in engines.values()),
+                          'failed_urls': [url for e in engines.values() for url, _ in e.failures]})
+            if index_path:
+                mark = time.perf_counter()
+                try:
+                    with metrics.span("index"):
+                        stats['index'] = index_tree(dests, index_path, catalog_path=catalog_path)
+                except Exception as e:
+                    logging.error(f"Full-text indexing failed: {e}")
+                stats['stages']['index'] = time.perf_counter() - mark
+        if catalog is not None:
+            catalog.finish_run(run_id)
+            catalog.close()
+        waits.finish(waits_path)
+        if artifacts is not None:
+            artifacts.close()
+            stats['failed_steps'] = artifacts.failures
+        if guard is not None:
+            stats['memory'] = guard.stop()
+        stats['http'] = throttle.stats()
+        exporter.stop()
+        metrics.recorder.gauge_sources.clear()
+        metrics.log_summary()
+        metrics.recorder.run['stats'] = {k: v for k, v in stats.items() if k != 'series_seconds'}
+        metrics.write_report(report_path)
+    stats['wall_time'] = time.perf_counter() - started
+    stats['report'] = report_path
+    return stats
@@ -0,0 +1,267 @@
+import os
+import time
+import hashlib
+import tempfile
+import queue
+import logging
+import threading
+from requests.exceptions import ChunkedEncodingError, ConnectionError, Timeout
+from metrics import span
+from ratelimit import Throttle, mount, retry_delay
+
+CHUNK_SIZE = 64 * 1024
+PDF_MAGIC = b"%PDF"
+PARTIAL_SUFFIX = ".part"
+# A live download or manifest save touches its temp file far more often than this
+STALE_PARTIAL_SECONDS = 3600
+
+# mkstemp creates files as 0600; finished papers should get the normal umask mode
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+class DownloadError(Exception):
+    pass
+
+class TruncatedBody(DownloadError):
+    pass
+
+# Failures part-way through a body; the request itself is retried by the session's ThrottledAdapter
+BODY_ERRORS = (TruncatedBody, ChunkedEncodingError, ConnectionError, Timeout)
+BODY_RETRIES = 2
+
+def remove_partial_downloads(base_dir, max_age=STALE_PARTIAL_SECONDS):
+    """Delete temp files left behind by a run that was killed mid-download.
+
+    Only temp files untouched for max_age seconds are removed, so the live
+    downloads of another run or worker process sharing the folder are left alone.
+    """
+    removed = 0
+    cutoff = time.time() - max_age
+    for root, _, files in os.walk(base_dir):
+        for name in files:
+            if name.endswith(PARTIAL_SUFFIX):
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    # Its owner finished (or cleaned up) in the meantime
+                    pass
+    if removed:
+        logging.info(f"Removed {removed} partial downloads from {base_dir}")
+
+def download_file(session, url, filepath, manifest=None, store=None, retries=BODY_RETRIES):
+    """Stream one PDF into a temp file and atomically rename it into place.
+
+    The body is rejected as soon as it does not start with %PDF, and again if
+    it is shorter than Content-Length. With a manifest, fresh files are skipped
+    and older ones are only re-fetched if the server says they changed. With a
+    BlobStore the file is stored once by SHA-256 and filepath becomes a link to
+    it; a URL the store already holds is only revalidated and linked.
+    A body that breaks off part-way is fetched again up to retries times.
+    Returns {'path', 'size', 'sha256', 'status'} where status is 'downloaded',
+    'fresh', 'not_modified' or 'linked', or None on failure.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return _download(session, url, filepath, manifest, store)
+        except BODY_ERRORS as e:
+            if attempt == retries:
+                logging.error(f"Download error for {url}: {e} (gave up after {retries + 1} attempts)")
+                return None
+            delay = retry_delay(attempt)
+            logging.warning(f"Download of {url} broke off ({e}); retry {attempt + 1} in {delay:.1f}s")
+            time.sleep(delay)
+        except Exception as e:
+            logging.error(f"Download error for {url}: {e}")
+            return None
+
+def _download(session, url, filepath, manifest, store):
+    tmp_path = None
+    try:
+        if manifest is not None and manifest.is_fresh(filepath, url):
+            logging.info(f"Up to date (manifest): {os.path.basename(filepath)}")
+            entry = manifest.get(filepath)
+            return {'path': filepath, 'size': entry['size'], 'sha256': entry['sha256'], 'status': 'fresh'}
+
+        headers = manifest.conditional_headers(filepath, url) if manifest is not None else {}
+        held = None
+        if not headers and store is not None:
+            held = store.lookup(url)
+            if held:
+                headers = store.conditional_headers(held)
+        dirname = os.path.dirname(filepath)
+        os.makedirs(dirname, exist_ok=True)
+        start = time.perf_counter()
+        with session.get(url, timeout=30, stream=True, headers=headers) as r:
+            if r.status_code == 304 and held:
+                # Same document already stored for another path or job
+                store.link(held['sha256'], filepath)
+                if manifest is not None:
+                    manifest.record(filepath, url, {'ETag': held['etag'], 'Last-Modified': held['last_modified']},
+                                    held['size'], held['sha256'])
+                logging.info(f"Linked from store: {os.path.basename(filepath)}")
+                return {'path': filepath, 'size': held['size'], 'sha256': held['sha256'], 'status': 'linked'}
+            if r.status_code == 304 and headers:
+                manifest.touch(filepath)
+                logging.info(f"Not modified: {os.path.basename(filepath)}")
+                entry = manifest.get(filepath)
+                return {'path': filepath, 'size': entry['size'], 'sha256': entry['sha256'], 'status': 'not_modified'}
+            if r.status_code != 200:
+                logging.warning(f"Failed to download {url}: Status {r.status_code}")
+                return None
+
+            # Content-Length is the encoded size, so only compare it for identity bodies
+            expected = r.headers.get("Content-Length")
+            if r.headers.get("Content-Encoding", "identity") != "identity":
+                expected = None
+
+            response_headers = r.headers
+            fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=PARTIAL_SUFFIX, dir=dirname)
+            sha = hashlib.sha256()
+            size = 0
+            head = b""
+            with os.fdopen(fd, "wb") as f:
+                for chunk in r.iter_content(CHUNK_SIZE):
+                    if not chunk: continue
+                    if len(head) < len(PDF_MAGIC):
+                        head += chunk[:len(PDF_MAGIC) - len(head)]
+                        if len(head) == len(PDF_MAGIC) and head != PDF_MAGIC:
+                            raise DownloadError(f"not a PDF (starts with {head!r}, Content-Type {r.headers.get('Content-Type')})")
+                    sha.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+
+        if head != PDF_MAGIC:
+            raise DownloadError(f"not a PDF ({size} bytes)")
+        if expected is not None and size != int(expected):
+            raise TruncatedBody(f"truncated body ({size} of {expected} bytes)")
+
+        if store is not None:
+            store.add(tmp_path, sha.hexdigest(), url, response_headers, size)
+            tmp_path = None
+            store.link(sha.hexdigest(), filepath)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+            os.replace(tmp_path, filepath)
+            tmp_path = None
+        if manifest is not None:
+            manifest.record(filepath, url, response_headers, size, sha.hexdigest())
+        elapsed = time.perf_counter() - start
+        logging.info(f"Downloaded: {os.path.basename(filepath)} ({size / 1024:.0f} KB in {elapsed:.2f}s, {size / 1024 / max(elapsed, 1e-6):.0f} KB/s)")
+        return {'path': filepath, 'size': size, 'sha256': sha.hexdigest(), 'status': 'downloaded'}
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+class DownloadEngine:
+    """Runs download_file on a pool of worker threads fed from a bounded queue.
+
+    submit() only blocks when the queue is full, so the browser can keep
+    navigating while earlier downloads drain. Every request goes through a
+    Throttle (ratelimit.py): a per-host token bucket and a concurrency limit
+    that starts at per_host and adapts to 429/503s and latency, with retries.
+    Downloads that still fail are listed in failures and logged on close.
+    An optional Manifest is passed through to
+    download_file and saved when the engine closes. An optional listener (e.g.
+    a Catalog) is told queued(url, filepath) and finished(url, filepath, result).
+    With a BlobStore, files are stored once by content and linked into place.
+    """
+
+    def __init__(self, session, workers=4, per_host=4, queue_size=64, manifest=None, listener=None, store=None, throttle=None):
+        self.session = session
+        self.manifest = manifest
+        self.store = store
+        self.listener = listener
+        self.workers = workers
+        self.throttle = throttle or Throttle(concurrency=per_host, max_concurrency=max(workers, per_host))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.lock = threading.Lock()
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.failures = []
+        self.started = time.perf_counter()
+        mount(session, self.throttle, pool_size=max(workers, per_host))
+
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self._worker, name=f"download-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, url, filepath):
+        if self.listener is not None:
+            self.listener.queued(url, filepath)
+        self.queue.put((url, filepath))
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            url, filepath = item
+            try:
+                with span("download") as s:
+                    result = download_file(self.session, url, filepath, manifest=self.manifest, store=self.store)
+                    if result is None:
+                        s.fail()
+                    else:
+                        s.attrs['status'] = result['status']
+                        s.add("bytes", result['size'] if result['status'] == 'downloaded' else 0)
+                with self.lock:
+                    if result is None:
+                        self.failed += 1
+                        self.failures.append((url, filepath))
+                    elif result['status'] != 'downloaded':
+                        self.skipped += 1
+                    else:
+                        self.ok += 1
+                        self.bytes += result['size']
+                if self.listener is not None:
+                    self.listener.finished(url, filepath, result)
+            except Exception as e:
+                logging.error(f"Download worker error for {url}: {e}")
+                with self.lock:
+                    self.failed += 1
+                    self.failures.append((url, filepath))
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait for every queued download to finish and save the manifest and blob index; the workers keep running."""
+        self.queue.join()
+        if self.manifest is not None:
+            self.manifest.save()
+        if self.store is not None:
+            self.store.save()
+
+    def close(self):
+        """Wait for every queued download to finish, then stop the workers."""
+        self.flush()
+        for _ in self.threads:
+            self.queue.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+        self.report()
+
+    def report(self):
+        elapsed = time.perf_counter() - self.started
+        mb = self.bytes / (1024 * 1024)
+        logging.info(f"Downloads finished: {self.ok} ok, {self.skipped} unchanged, {self.failed} failed, {mb:.1f} MB in {elapsed:.1f}s ({mb / max(elapsed, 1e-6):.2f} MB/s)")
+        for host, h in self.throttle.stats().items():
+            logging.info(f"  {host}: {h['requests']} requests, {h['throttled']} throttled, ended at concurrency {h['concurrency']} and {h['rate']} req/s")
+        for url, filepath in self.failures:
+            logging.error(f"  Not downloaded: {url} -> {filepath}")
@@ -0,0 +1,263 @@
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from blobstore import hash_file
+from classifier import classify
+from http_backend import SERIES_RE
+
+# PyMuPDF is much faster; pypdf is pure Python. One of them is needed to extract text
+try:
+    import fitz
+except ImportError:
+    fitz = None
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+INDEX_PATH = "fulltext.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    series TEXT,
+    kind TEXT,
+    code TEXT
+);
+CREATE TABLE IF NOT EXISTS texts (
+    sha256 TEXT PRIMARY KEY,
+    page_count INTEGER,
+    title TEXT,
+    cover_code TEXT,
+    error TEXT,
+    extracted_at REAL
+);
+CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256);
+CREATE INDEX IF NOT EXISTS files_code ON files (series, code, kind);
+CREATE VIRTUAL TABLE IF NOT EXISTS pages USING fts5(text, sha256 UNINDEXED, page UNINDEXED, tokenize='porter unicode61');
+"""
+
+# The paper reference on a cover, e.g. "Paper reference 4MA1/1H" or "9MA0/01"
+COVER_CODE_RE = re.compile(r'\b((?=[A-Z0-9]*[A-Z])(?=[A-Z0-9]*\d)[A-Z0-9]{4,5})\s*/\s*(\d[A-Z0-9]{0,3})\b')
+
+def cover_code(text):
+    """The first paper reference on a page, in the classifier's form (4MA1-1H), or None."""
+    m = COVER_CODE_RE.search(text or "")
+    return f"{m.group(1)}-{m.group(2)}" if m else None
+
+def require_extractor():
+    """Raise ImportError, saying what to install, when neither PDF text extractor is available."""
+    if fitz is None and PdfReader is None:
+        raise ImportError("Full-text indexing needs PyMuPDF or pypdf (pip install pymupdf, or pip install pypdf)")
+
+def extract(path):
+    """Text of every page, the PDF title and the cover's paper code. Runs in the worker processes."""
+    try:
+        if fitz is not None:
+            with fitz.open(path) as doc:
+                pages = [page.get_text() for page in doc]
+                title = (doc.metadata or {}).get('title')
+        else:
+            reader = PdfReader(path)
+            pages = [page.extract_text() or "" for page in reader.pages]
+            title = reader.metadata.title if reader.metadata else None
+        return {'pages': pages, 'title': title or None, 'cover_code': cover_code(pages[0] if pages else "")}
+    except Exception as e:
+        return {'pages': [], 'title': None, 'cover_code': None, 'error': str(e)[:200]}
+
+def _describe(path, catalog):
+    """(series, kind, code) for a file: from the catalog when it lists the path, else from the path itself."""
+    if catalog is not None:
+        row = catalog.execute("""SELECT d.series, d.kind, d.code FROM files f JOIN documents d ON d.url = f.url
+                                 WHERE f.path = ? LIMIT 1""", (path,)).fetchone()
+        if row:
+            return tuple(row)
+    series = SERIES_RE.search(path)
+    # e.g. "Paper 1F / paper / Question_Paper_4MA1-1F.pdf" or "... (9MA0-01) / marking_scheme / 9ma0-01-rms.pdf"
+    parts = os.path.normpath(path).split(os.sep)[-3:]
+    info = classify(" ".join(parts).replace("_", " "))
+    return (series.group(0) if series else None), info.kind, info.code
+
+class FullTextIndex:
+    """SQLite FTS5 index of the text of every downloaded PDF.
+
+    Files are keyed by path (size and mtime tell when one changed) and their
+    text by SHA-256, so a paper linked into several folders is extracted
+    once, and a re-run only extracts new or changed files.
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def update(self, roots, workers=None, catalog_path=None):
+        """Bring the index up to date with every PDF under roots. Returns counters."""
+        require_extractor()
+        started = time.perf_counter()
+        catalog = sqlite3.connect(catalog_path) if catalog_path and os.path.exists(catalog_path) else None
+        known = {r['path']: r for r in self.db.execute("SELECT path, sha256, size, mtime_ns FROM files")}
+        seen, changed = set(), []
+        for root in roots:
+            for folder, _, names in os.walk(root):
+                for name in names:
+                    if not name.lower().endswith(".pdf"):
+                        continue
+                    path = os.path.join(folder, name)
+                    st = os.stat(path)
+                    seen.add(path)
+                    row = known.get(path)
+                    if row is None or row['size'] != st.st_size or row['mtime_ns'] != st.st_mtime_ns:
+                        changed.append((path, st))
+
+        stats = {'files': len(seen), 'changed': len(changed), 'extracted': 0, 'errors': 0, 'removed': 0}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            hashes = list(pool.map(hash_file, [p for p, _ in changed], chunksize=16))
+            for (path, st), sha256 in zip(changed, hashes):
+                series, kind, code = _describe(path, catalog)
+                self.db.execute("INSERT OR REPLACE INTO files (path, sha256, size, mtime_ns, series, kind, code) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (path, sha256, st.st_size, st.st_mtime_ns, series, kind, code))
+            held = {r[0] for r in self.db.execute("SELECT sha256 FROM texts")}
+            todo = {}
+            for (path, _), sha256 in zip(changed, hashes):
+                if sha256 not in held:
+                    todo.setdefault(sha256, path)
+            for n, (sha256, result) in enumerate(zip(todo, pool.map(extract, list(todo.values()), chunksize=4)), 1):
+                self.db.execute("INSERT OR REPLACE INTO texts (sha256, page_count, title, cover_code, error, extracted_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                (sha256, len(result['pages']), result['title'], result['cover_code'], result.get('error'), time.time()))
+                self.db.executemany("INSERT INTO pages (text, sha256, page) VALUES (?, ?, ?)",
+                                    [(text, sha256, i) for i, text in enumerate(result['pages'], 1) if text.strip()])
+                stats['extracted'] += 1
+                if result.get('error'):
+                    stats['errors'] += 1
+                    logging.warning(f"Could not extract {todo[sha256]}: {result['error']}")
+                if n % 100 == 0:
+                    self.db.commit()
+                    logging.info(f"Extracted {n}/{len(todo)} PDFs")
+
+        gone = [p for p in known if p not in seen]
+        self.db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in gone])
+        stats['removed'] = len(gone)
+        # Text no file points at any more (deleted, or replaced by a changed download)
+        self.db.execute("DELETE FROM pages WHERE sha256 NOT IN (SELECT sha256 FROM files)")
+        self.db.execute("DELETE FROM texts WHERE sha256 NOT IN (SELECT sha256 FROM files)")
+        self.db.commit()
+        if catalog is not None:
+            catalog.close()
+        stats['seconds'] = round(time.perf_counter() - started, 2)
+        logging.info(f"Full-text index: {stats['files']} files, {stats['changed']} new or changed, "
+                     f"{stats['extracted']} extracted ({stats['errors']} failed), {stats['removed']} removed in {stats['seconds']}s")
+        return stats
+
+    def search(self, query, series=None, kind=None, limit=50, phrase=True):
+        """Files whose text matches query, best first, with the first matching page and a snippet.
+
+        query is one phrase unless phrase=False, when it is passed to FTS5
+        as is (AND / OR / NEAR, prefix*). series matches a substring of the
+        series ("June", "June 2019") and kind is "qp" or "ms".
+        """
+        match = '"' + query.replace('"', '""') + '"' if phrase else query
+        sql = """SELECT f.path, f.series, f.kind, f.code, t.cover_code, t.page_count, p.page,
+                        snippet(pages, 0, '[', ']', '...', 12) AS snippet
+                 FROM pages p JOIN files f ON f.sha256 = p.sha256 JOIN texts t ON t.sha256 = p.sha256
+                 WHERE pages MATCH ?"""
+        args = [match]
+        if series:
+            sql += " AND f.series LIKE ?"
+            args.append(f"%{series}%")
+        if kind:
+            sql += " AND f.kind = ?"
+            args.append(kind)
+        sql += " ORDER BY p.rank"
+        # One row per file, from its best-ranked page
+        rows = {}
+        for r in self.db.execute(sql, args):
+            if r['path'] not in rows:
+                rows[r['path']] = dict(r)
+                if len(rows) == limit:
+                    break
+        return list(rows.values())
+
+    def verify_pairs(self):
+        """Check every QP / MS pair the titles put together against the codes printed on their covers.
+
+        Returns one row per (series, code) with both kinds: status is "ok"
+        when both covers show the same code as the title, "mismatch" when
+        they disagree and "unverified" when a cover code could not be read.
+        """
+        rows = self.db.execute("""SELECT f.path, f.series, f.code, f.kind, t.cover_code FROM files f
+                                  JOIN texts t ON t.sha256 = f.sha256
+                                  WHERE f.kind IN ('qp', 'ms') AND f.code IS NOT NULL
+                                  ORDER BY f.series, f.code, f.kind, f.path""")
+        groups = {}
+        for r in rows:
+            groups.setdefault((r['series'], r['code']), {}).setdefault(r['kind'], r)
+        pairs = []
+        for (series, code), kinds in groups.items():
+            if 'qp' not in kinds or 'ms' not in kinds:
+                continue
+            qp, ms = kinds['qp'], kinds['ms']
+            covers = (qp['cover_code'], ms['cover_code'])
+            if None in covers:
+                status = "unverified"
+            elif covers[0] == covers[1] == code:
+                status = "ok"
+            else:
+                status = "mismatch"
+            pairs.append({'series': series, 'code': code, 'status': status, 'qp': qp['path'], 'ms': ms['path'],
+                          'qp_cover': covers[0], 'ms_cover': covers[1]})
+        return pairs
+
+    def close(self):
+        self.db.close()
+
+def index_tree(roots, path=INDEX_PATH, workers=None, catalog_path=None):
+    index = FullTextIndex(path)
+    try:
+        return index.update(roots, workers=workers, catalog_path=catalog_path)
+    finally:
+        index.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="Full-text index of the downloaded papers; rows are printed as JSON Lines")
+    parser.add_argument("command", choices=["index", "search", "verify"])
+    parser.add_argument("args", nargs="*", help="folders to index (index) or the query (search)")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--catalog", default="catalog.db", help="catalog for series / kind / code of each file")
+    parser.add_argument("--workers", type=int, help="extraction processes (default: one per CPU)")
+    parser.add_argument("--series", help="only series containing this, e.g. June")
+    parser.add_argument("--kind", choices=["qp", "ms"])
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--fts", action="store_true", help="pass the query to FTS5 as is instead of as one phrase")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        if not args.args:
+            sys.exit("index needs at least one folder, e.g. papers_igcse papers_paired")
+        print(json.dumps(index_tree(args.args, args.index, workers=args.workers, catalog_path=args.catalog)))
+        sys.exit(0)
+
+    index = FullTextIndex(args.index)
+    started = time.perf_counter()
+    if args.command == "search":
+        rows = index.search(" ".join(args.args), series=args.series, kind=args.kind, limit=args.limit, phrase=not args.fts)
+    else:
+        rows = index.verify_pairs()
+        rows = [r for r in rows if r['status'] != "ok"] + [r for r in rows if r['status'] == "ok"]
+    for row in rows:
+        sys.stdout.write(json.dumps(row) + "\n")
+    logging.info(f"{len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+    index.close()
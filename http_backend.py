@@ -0,0 +1,165 @@
+import re
+import sys
+import json
+import logging
+import requests
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+from requests.adapters import HTTPAdapter
+
+# Fast parsers are optional; the standard library parser is the fallback
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+    except ImportError:
+        SelectolaxParser = None
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+SERIES_RE = re.compile(r'(June|January|November|Summer|Winter)\s*20\d{2}', re.IGNORECASE)
+
+def make_session(pool_size=10):
+    """A requests session with a connection pool sized for pool_size concurrent fetches."""
+    session = requests.Session()
+    session.headers.update({"User-Agent": USER_AGENT})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def _clean(text):
+    return " ".join((text or "").split())
+
+def _anchors_selectolax(html):
+    anchors = []
+    for a in SelectolaxParser(html).css("a"):
+        title_el = a.css_first(".doc-title")
+        anchors.append({
+            'href': a.attributes.get("href") or "",
+            'classes': (a.attributes.get("class") or "").split(),
+            'text': _clean(a.text(separator=" ")),
+            'title': _clean(title_el.text(separator=" ")) if title_el is not None else None,
+        })
+    return anchors
+
+def _anchors_lxml(html):
+    anchors = []
+    doc = lxml.html.fromstring(html)
+    for a in doc.iter("a"):
+        title_el = a.xpath(".//*[contains(concat(' ', normalize-space(@class), ' '), ' doc-title ')]")
+        anchors.append({
+            'href': a.get("href") or "",
+            'classes': (a.get("class") or "").split(),
+            'text': _clean(a.text_content()),
+            'title': _clean(title_el[0].text_content()) if title_el else None,
+        })
+    return anchors
+
+class _AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.anchors = []
+        self.current = None
+        self.title_depth = 0
+        self.depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "a":
+            self.current = {'href': attrs.get("href") or "", 'classes': (attrs.get("class") or "").split(), 'text': [], 'title': None}
+            self.depth = 0
+            self.title_depth = 0
+        elif self.current is not None and tag not in VOID_TAGS:
+            self.depth += 1
+            if not self.title_depth and "doc-title" in (attrs.get("class") or "").split():
+                self.title_depth = self.depth
+                self.current['title'] = []
+
+    def handle_endtag(self, tag):
+        if self.current is None or tag in VOID_TAGS:
+            return
+        if tag == "a":
+            a = self.current
+            a['text'] = _clean("".join(a['text']))
+            a['title'] = _clean("".join(a['title'])) if a['title'] is not None else None
+            self.anchors.append(a)
+            self.current = None
+        else:
+            if self.title_depth and self.depth == self.title_depth:
+                self.title_depth = -1
+            self.depth -= 1
+
+    def handle_data(self, data):
+        if self.current is None:
+            return
+        self.current['text'].append(" " + data)
+        if self.title_depth > 0:
+            self.current['title'].append(" " + data)
+
+def _anchors_stdlib(html):
+    parser = _AnchorParser()
+    parser.feed(html)
+    parser.close()
+    return parser.anchors
+
+if SelectolaxParser is not None:
+    extract_anchors = _anchors_selectolax
+elif lxml is not None:
+    extract_anchors = _anchors_lxml
+else:
+    extract_anchors = _anchors_stdlib
+
+def results_from_anchors(anchors, base_url=""):
+    """Pick the result rows out of anchor records ({'href', 'classes', 'text', 'title'}).
+
+    `a.result-item .doc-title` rows when the results table is present,
+    otherwise every `a[href*='.pdf']` with its text. The browser backends
+    pass records gathered in the page by ANCHORS_JS, so all of them share this.
+    """
+    results = []
+    items = [a for a in anchors if "result-item" in a['classes']]
+    if items:
+        for a in items:
+            if not a['href'] or "javascript" in a['href'].lower() or not a['title']: continue
+            results.append({'href': urljoin(base_url, a['href']), 'title': a['title']})
+    else:
+        for a in anchors:
+            if ".pdf" not in a['href'].lower() or not a['text']: continue
+            results.append({'href': urljoin(base_url, a['href']), 'title': a['text']})
+    return results
+
+def series_from_anchors(anchors, base_url=""):
+    """Pick [{'label', 'href'}] for exam-series links out of anchor records, in page order."""
+    series = []
+    seen = set()
+    for a in anchors:
+        if not SERIES_RE.search(a['text']) or a['text'] in seen: continue
+        seen.add(a['text'])
+        series.append({'label': a['text'], 'href': urljoin(base_url, a['href']) if a['href'] else ""})
+    return series
+
+def parse_results(html, base_url=""):
+    """Extract [{'href', 'title'}] from a results page or fragment."""
+    return results_from_anchors(extract_anchors(html), base_url)
+
+def parse_series(html, base_url=""):
+    """Extract [{'label', 'href'}] for exam-series links, in page order."""
+    return series_from_anchors(extract_anchors(html), base_url)
+
+def fetch_results(session, url):
+    r = session.get(url, timeout=30)
+    r.raise_for_status()
+    return parse_results(r.text, r.url)
+
+if __name__ == "__main__":
+    # Print the records extracted from one or more results pages as JSON
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    session = make_session()
+    for url in sys.argv[1:]:
+        print(json.dumps(fetch_results(session, url), indent=2))
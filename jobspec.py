@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from http_backend import SERIES_RE
+
+# The jobs the scrapers run, by name; any other file of the same shape can be passed with --jobs
+JOBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.json")
+LAYOUTS = ["qp", "by_code", "paired"]
+KINDS = ["qp", "ms"]
+FIELDS = {'qualification', 'subjects', 'spec', 'series', 'sessions', 'years', 'exclude_years', 'kinds', 'limit', 'layout', 'dest', 'code_prefixes'}
+YEARS_RE = re.compile(r'^\s*(\d{4})\s*(?:-\s*(\d{4})\s*)?$')
+
+def parse_years(value):
+    """A set of years from 2021, "2021", "2017-2023" or a list of those; None when value is empty."""
+    if value in (None, "", []):
+        return None
+    years = set()
+    for part in value if isinstance(value, list) else [value]:
+        m = YEARS_RE.match(str(part))
+        if not m:
+            raise ValueError(f"Bad year or year range {part!r}; use e.g. 2021 or \"2017-2023\"")
+        first, last = int(m.group(1)), int(m.group(2) or m.group(1))
+        years.update(range(min(first, last), max(first, last) + 1))
+    return years
+
+def series_filter(spec):
+    """One predicate over series names from a job's series regex, sessions, years and exclude_years; None for every series.
+
+    Any of sessions / years / exclude_years also requires the name to carry a
+    session and year the way SERIES_RE reads them ("June 2019").
+    """
+    pattern = re.compile(spec['series'], re.IGNORECASE) if spec.get('series') else None
+    sessions = {s.lower() for s in spec.get('sessions') or []}
+    years = parse_years(spec.get('years'))
+    excluded = parse_years(spec.get('exclude_years')) or set()
+    if pattern is None and not (sessions or years or excluded):
+        return None
+
+    def accept(name):
+        if pattern is not None and not pattern.search(name):
+            return False
+        if sessions or years or excluded:
+            m = SERIES_RE.search(name)
+            if not m:
+                return False
+            year = int(m.group(0)[-4:])
+            if sessions and m.group(1).lower() not in sessions:
+                return False
+            if (years and year not in years) or year in excluded:
+                return False
+        return True
+    return accept
+
+def describe(spec):
+    """The job's filters in a line, for plans and logs."""
+    parts = []
+    for key in ('series', 'sessions', 'years', 'exclude_years', 'kinds', 'limit'):
+        if spec.get(key):
+            value = spec[key]
+            parts.append(f"{key}={','.join(map(str, value)) if isinstance(value, list) else value}")
+    return " ".join(parts) or "every series"
+
+def compile_job(name, spec):
+    """A job as core.run takes it, from its declarative spec. Raises ValueError on a bad spec."""
+    unknown = set(spec) - FIELDS
+    if unknown:
+        raise ValueError(f"Job {name}: unknown fields {sorted(unknown)}; expected some of {sorted(FIELDS)}")
+    for key in ('qualification', 'subjects', 'dest'):
+        if not spec.get(key):
+            raise ValueError(f"Job {name}: {key} is required")
+    subjects = spec['subjects'] if isinstance(spec['subjects'], list) else [spec['subjects']]
+    layout = spec.get('layout', "paired")
+    if layout not in LAYOUTS:
+        raise ValueError(f"Job {name}: layout must be one of {LAYOUTS}, not {layout!r}")
+    kinds = spec.get('kinds')
+    if kinds and set(kinds) - set(KINDS):
+        raise ValueError(f"Job {name}: kinds must be some of {KINDS}, not {kinds}")
+    code_prefixes = spec.get('code_prefixes') or {}
+    if not isinstance(code_prefixes, dict):
+        raise ValueError(f"Job {name}: code_prefixes must map subjects to paper code prefixes, e.g. {{\"Mathematics A\": \"4MA1\"}}")
+    return {
+        'name': name, 'qualification': spec['qualification'], 'subjects': subjects, 'spec': spec.get('spec'),
+        'series': series_filter(spec), 'limit': spec.get('limit'), 'kinds': kinds, 'layout': layout,
+        'dest': spec['dest'], 'code_prefixes': code_prefixes, 'describe': describe(spec),
+    }
+
+def load_jobs(path=JOBS_PATH):
+    """Every job in a JSON file of {name: spec}, compiled."""
+    with open(path, encoding="utf-8") as f:
+        specs = json.load(f)
+    return {name: compile_job(name, spec) for name, spec in specs.items()}
+
+def plan(jobs):
+    """Compile jobs into one navigation plan: a step per qualification / subject / spec, in an order that shares prefixes.
+
+    Steps are grouped by qualification (in the order the jobs first name
+    them), then by subject letter and subject, so the widget keeps its
+    qualification and letter selected from one step to the next instead of
+    starting over. A subject two jobs both want is one step that serves
+    both: each step lists its jobs, and a series is only opened when one of
+    them still wants it.
+    """
+    steps = {}
+    qualifications = []
+    for job in jobs:
+        if job['qualification'] not in qualifications:
+            qualifications.append(job['qualification'])
+        for subject in job['subjects']:
+            key = (job['qualification'], subject, job.get('spec') or "")
+            step = steps.setdefault(key, {'qualification': job['qualification'], 'letter': subject[0].upper(),
+                                          'subject': subject, 'spec': job.get('spec'), 'jobs': []})
+            if job not in step['jobs']:
+                step['jobs'].append(job)
+    return sorted(steps.values(), key=lambda s: (qualifications.index(s['qualification']), s['letter'],
+                                                  s['subject'].lower(), s['spec'] or ""))
+
+def format_plan(steps):
+    lines = []
+    previous = (None, None)
+    for step in steps:
+        if step['qualification'] != previous[0]:
+            lines.append(step['qualification'])
+        if (step['qualification'], step['letter']) != previous:
+            lines.append(f"  {step['letter']}")
+        previous = (step['qualification'], step['letter'])
+        lines.append(f"    {step['subject']}{' ' + step['spec'] if step['spec'] else ''}")
+        for job in step['jobs']:
+            lines.append(f"      -> {job.get('name', job['dest'])}: {job.get('describe', '')} [{job['layout']} into {job['dest']}]")
+    return "\n".join(lines)
+
+def job_from_args(args):
+    """A one-off job from the command line flags, or None when no --qualification was given."""
+    if not args.qualification:
+        return None
+    spec = {'qualification': args.qualification, 'subjects': args.subject or [], 'spec': args.spec, 'series': args.series,
+            'sessions': args.sessions, 'years': args.years, 'exclude_years': args.exclude_years, 'kinds': args.kinds,
+            'limit': args.limit, 'layout': args.layout, 'dest': args.dest}
+    return compile_job("cli", {k: v for k, v in spec.items() if v not in (None, [])})
+
+if __name__ == "__main__":
+    from core import run
+    from backends import BACKENDS
+    from transport import TRANSPORTS
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Show or run the navigation plan for one or more declarative jobs")
+    parser.add_argument("command", choices=["plan", "run"])
+    parser.add_argument("names", nargs="*", help="jobs from the jobs file to include")
+    parser.add_argument("--jobs", default=JOBS_PATH, help="JSON file of {name: job spec}")
+    parser.add_argument("--qualification", help="define a one-off job instead of (or as well as) named ones")
+    parser.add_argument("--subject", action="append", help="subject of the one-off job (repeatable)")
+    parser.add_argument("--spec", help="specification edition, e.g. (2016)")
+    parser.add_argument("--series", help="regex the series name must match")
+    parser.add_argument("--sessions", nargs="+", help="e.g. June November")
+    parser.add_argument("--years", nargs="+", help="years or ranges, e.g. 2019-2023")
+    parser.add_argument("--exclude-years", nargs="+")
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, help="document types to download (default: all)")
+    parser.add_argument("--limit", type=int, help="only the first N matching series per subject")
+    parser.add_argument("--layout", choices=LAYOUTS)
+    parser.add_argument("--dest")
+    parser.add_argument("--backend", choices=BACKENDS, default="selenium")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="requests")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        available = load_jobs(args.jobs)
+        unknown = [n for n in args.names if n not in available]
+        if unknown:
+            raise ValueError(f"Unknown jobs {unknown}; {args.jobs} has {sorted(available)}")
+        jobs = [available[n] for n in args.names]
+        one_off = job_from_args(args)
+    except ValueError as e:
+        sys.exit(str(e))
+    if one_off:
+        jobs.append(one_off)
+    if not jobs:
+        sys.exit(f"Name some jobs ({', '.join(sorted(available))}) or define one with --qualification")
+    print(format_plan(plan(jobs)))
+    if args.command == "run":
+        stats = run(jobs, backend=args.backend, workers=args.workers, transport=args.transport, headless=args.headless)
+        print(json.dumps({k: v for k, v in stats.items() if k != 'series_seconds'}, indent=2, default=str))
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+MANIFEST_NAME = "manifest.json"
+
+class Manifest:
+    """Per-output-folder record of every downloaded file.
+
+    Entries are keyed by path relative to the folder and hold the source URL,
+    ETag, Last-Modified, size, SHA-256 and when the server last confirmed the
+    copy. A file confirmed less than fresh_for seconds ago is skipped without
+    a request; older ones are revalidated with If-None-Match / If-Modified-Since.
+    """
+
+    def __init__(self, folder, fresh_for=12 * 3600, save_every=20):
+        self.folder = folder
+        self.path = os.path.join(folder, MANIFEST_NAME)
+        self.fresh_for = fresh_for
+        self.save_every = save_every
+        self.lock = threading.Lock()
+        self.dirty = 0
+        self.entries = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+            logging.info(f"Loaded manifest with {len(self.entries)} entries from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    def _key(self, filepath):
+        return os.path.relpath(filepath, self.folder).replace(os.sep, "/")
+
+    def _valid_entry(self, filepath, url):
+        entry = self.entries.get(self._key(filepath))
+        if not entry or entry.get('url') != url:
+            return None
+        try:
+            if os.path.getsize(filepath) != entry.get('size'):
+                return None
+        except OSError:
+            return None
+        return entry
+
+    def is_fresh(self, filepath, url):
+        with self.lock:
+            entry = self._valid_entry(filepath, url)
+            return bool(entry) and time.time() - entry.get('checked_at', 0) < self.fresh_for
+
+    def conditional_headers(self, filepath, url):
+        with self.lock:
+            entry = self._valid_entry(filepath, url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def get(self, filepath):
+        with self.lock:
+            return self.entries.get(self._key(filepath))
+
+    def record(self, filepath, url, headers, size, sha256):
+        with self.lock:
+            self.entries[self._key(filepath)] = {
+                'url': url,
+                'etag': headers.get('ETag'),
+                'last_modified': headers.get('Last-Modified'),
+                'size': size,
+                'sha256': sha256,
+                'checked_at': time.time(),
+            }
+            self._changed()
+
+    def touch(self, filepath):
+        """Mark an entry as just confirmed unchanged by the server (304)."""
+        with self.lock:
+            entry = self.entries.get(self._key(filepath))
+            if entry:
+                entry['checked_at'] = time.time()
+                self._changed()
+
+    def _changed(self):
+        self.dirty += 1
+        if self.dirty >= self.save_every:
+            self._write()
+
+    def save(self):
+        with self.lock:
+            if self.dirty:
+                self._write()
+
+    def _write(self):
+        os.makedirs(self.folder, exist_ok=True)
+        # Other processes sharing the folder (workqueue.py workers) may have written entries since we loaded
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                on_disk = json.load(f)
+            on_disk.update(self.entries)
+            self.entries = on_disk
+        except Exception:
+            pass
+        fd, tmp_path = tempfile.mkstemp(prefix=".manifest", suffix=".part", dir=self.folder)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.dirty = 0
@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+
+# psutil sees the browser processes (chromedriver, Chrome, the Playwright driver) as children of
+# this one; without it only this process is measured, from /proc on Linux
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MB = 1024 * 1024
+
+def own_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+def children_rss():
+    """Summed RSS of every descendant process (the browsers), or None without psutil."""
+    if psutil is None:
+        return None
+    total = 0
+    for p in psutil.Process().children(recursive=True):
+        try:
+            total += p.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+class MemoryGuard:
+    """Samples the RSS of this process and its browser processes, and decides when to recycle the browser.
+
+    check() is called once per finished series; it returns a reason once
+    every_series series have run on the current browser or the browser
+    processes have crossed ceiling_mb, and None otherwise. While running,
+    the latest sample is attached to every finished metrics span, so the
+    run report shows peak memory per stage.
+    """
+
+    def __init__(self, every_series=None, ceiling_mb=None, interval=1.0):
+        self.every_series = every_series
+        self.ceiling = ceiling_mb * MB if ceiling_mb else None
+        self.interval = interval
+        self.series = 0
+        self.recycles = 0
+        self.latest = {}
+        self.peak = {}
+        self.stop_event = threading.Event()
+        if self.ceiling and psutil is None:
+            logging.warning("psutil is not installed; the memory ceiling only sees this process, not the browser")
+        self.sample()
+        self.thread = threading.Thread(target=self._run, name="memory-guard", daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        python, browser = own_rss(), children_rss()
+        latest = {}
+        if python is not None:
+            latest['python_rss_mb'] = round(python / MB, 1)
+        if browser is not None:
+            latest['browser_rss_mb'] = round(browser / MB, 1)
+        self.latest = latest
+        for k, v in latest.items():
+            self.peak[k] = max(self.peak.get(k, 0), v)
+        return latest
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logging.debug(f"Memory sample failed: {e}")
+
+    def gauges(self):
+        return self.latest
+
+    def check(self):
+        self.series += 1
+        latest = self.sample()
+        if self.every_series and self.series >= self.every_series:
+            return f"{self.series} series on this browser"
+        if self.ceiling:
+            used = latest.get('browser_rss_mb', latest.get('python_rss_mb', 0)) * MB
+            if used > self.ceiling:
+                return f"browser at {used / MB:.0f} MB (ceiling {self.ceiling / MB:.0f} MB)"
+        return None
+
+    def recycled(self, reason):
+        self.recycles += 1
+        self.series = 0
+        logging.info(f"Recycling the browser: {reason}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+        peaks = ", ".join(f"{k} {v:.0f}" for k, v in self.peak.items())
+        logging.info(f"Memory peaks: {peaks}; browser recycled {self.recycles} times")
+        return dict(self.peak, recycles=self.recycles)
@@ -0,0 +1,254 @@
+import os
+import time
+import json
+import logging
+import tempfile
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the Prometheus duration histogram
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+# Keep every span of a short run, and the most recent ones of a long one
+MAX_SPANS = 20000
+TIMELINE_BUCKET = 60
+RUNS_DIR = "runs"
+
+_current = contextvars.ContextVar("metrics_span", default=None)
+
+class Span:
+    """One timed step. Counters (links found, bytes, retries, ...) are added while it runs."""
+
+    __slots__ = ("name", "attrs", "parent", "start", "wall_start", "duration", "outcome", "counters")
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.duration = None
+        self.outcome = "ok"
+        self.counters = {}
+
+    def add(self, counter, value=1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def fail(self, outcome="error"):
+        """Mark the span failed without raising (e.g. a wait that timed out)."""
+        self.outcome = outcome
+
+    def record(self):
+        return {
+            'name': self.name,
+            'parent': self.parent,
+            'start': self.wall_start,
+            'duration': self.duration,
+            'outcome': self.outcome,
+            'attrs': self.attrs,
+            'counters': self.counters,
+        }
+
+class Recorder:
+    """Collects finished spans and keeps per-stage aggregates for the run report and Prometheus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Callables returning {name: value}, sampled as each span ends (MemoryGuard.gauges, Throttle.gauges)
+        self.gauge_sources = []
+        self.reset()
+
+    def gauges(self):
+        gauges = {}
+        for source in list(self.gauge_sources):
+            gauges.update(source())
+        return gauges
+
+    def reset(self, run=None):
+        with self.lock:
+            self.run = run or {}
+            self.started = time.time()
+            self.spans = deque(maxlen=MAX_SPANS)
+            self.dropped = 0
+            self.stages = {}
+            self.timeline = {}
+
+    def finish(self, span):
+        span.duration = time.perf_counter() - span.start
+        gauges = self.gauges()
+        with self.lock:
+            if len(self.spans) == MAX_SPANS:
+                self.dropped += 1
+            self.spans.append(span)
+
+            stage = self.stages.get(span.name)
+            if stage is None:
+                stage = self.stages[span.name] = {'count': 0, 'total': 0.0, 'max': 0.0, 'outcomes': {}, 'counters': {},
+                                                  'gauges': {}, 'buckets': [0] * len(BUCKETS)}
+            stage['count'] += 1
+            stage['total'] += span.duration
+            stage['max'] = max(stage['max'], span.duration)
+            stage['outcomes'][span.outcome] = stage['outcomes'].get(span.outcome, 0) + 1
+            for k, v in span.counters.items():
+                stage['counters'][k] = stage['counters'].get(k, 0) + v
+            # Gauges keep the highest value seen at the end of the stage
+            for k, v in gauges.items():
+                stage['gauges'][k] = max(stage['gauges'].get(k, v), v)
+            for i, bound in enumerate(BUCKETS):
+                if span.duration <= bound:
+                    stage['buckets'][i] += 1
+
+            # Seconds spent per stage in each minute of the run, to see how the mix shifts over hours
+            minute = int((span.wall_start - self.started) // TIMELINE_BUCKET)
+            slot = self.timeline.setdefault(minute, {})
+            slot[span.name] = slot.get(span.name, 0.0) + span.duration
+
+    def summary(self):
+        with self.lock:
+            rows = []
+            for name, s in self.stages.items():
+                rows.append({
+                    'stage': name,
+                    'count': s['count'],
+                    'total': round(s['total'], 4),
+                    'mean': round(s['total'] / s['count'], 4),
+                    'max': round(s['max'], 4),
+                    'outcomes': dict(s['outcomes']),
+                    'counters': dict(s['counters']),
+                    'gauges': dict(s['gauges']),
+                })
+        return sorted(rows, key=lambda r: -r['total'])
+
+    def report(self):
+        with self.lock:
+            spans = [s.record() for s in self.spans]
+            timeline = [{'minute': m, 'seconds': {k: round(v, 3) for k, v in slot.items()}}
+                        for m, slot in sorted(self.timeline.items())]
+            run, started, dropped = dict(self.run), self.started, self.dropped
+        return {
+            'run': run,
+            'started': started,
+            'finished': time.time(),
+            'stages': self.summary(),
+            'timeline': timeline,
+            'spans': spans,
+            'spans_dropped': dropped,
+        }
+
+    def prometheus(self, prefix="scraper"):
+        """The aggregates in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Time spent in each scraper stage.",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        with self.lock:
+            stages = {name: dict(s, buckets=list(s['buckets']), outcomes=dict(s['outcomes']), counters=dict(s['counters']),
+                                 gauges=dict(s['gauges']))
+                      for name, s in self.stages.items()}
+            started = self.started
+        gauges = self.gauges()
+        for name, s in sorted(stages.items()):
+            for bound, n in zip(BUCKETS, s['buckets']):
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {n}')
+            lines.append(f'{prefix}_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {s["count"]}')
+            lines.append(f'{prefix}_stage_duration_seconds_sum{{stage="{name}"}} {s["total"]:.6f}')
+            lines.append(f'{prefix}_stage_duration_seconds_count{{stage="{name}"}} {s["count"]}')
+        lines += [f"# HELP {prefix}_stage_outcomes_total Finished spans by outcome.", f"# TYPE {prefix}_stage_outcomes_total counter"]
+        for name, s in sorted(stages.items()):
+            for outcome, n in sorted(s['outcomes'].items()):
+                lines.append(f'{prefix}_stage_outcomes_total{{stage="{name}",outcome="{outcome}"}} {n}')
+        lines += [f"# HELP {prefix}_stage_counter_total Counters recorded by spans (links, bytes, retries, ...).",
+                  f"# TYPE {prefix}_stage_counter_total counter"]
+        for name, s in sorted(stages.items()):
+            for counter, v in sorted(s['counters'].items()):
+                lines.append(f'{prefix}_stage_counter_total{{stage="{name}",counter="{counter}"}} {v}')
+        lines += [f"# HELP {prefix}_stage_gauge_max Highest gauge value (e.g. RSS in MB) seen as a stage ended.",
+                  f"# TYPE {prefix}_stage_gauge_max gauge"]
+        for name, s in sorted(stages.items()):
+            for gauge, v in sorted(s['gauges'].items()):
+                lines.append(f'{prefix}_stage_gauge_max{{stage="{name}",gauge="{gauge}"}} {v}')
+        lines += [f"# HELP {prefix}_gauge Current value of each gauge (RSS, HTTP concurrency limit and rate, ...).",
+                  f"# TYPE {prefix}_gauge gauge"]
+        for gauge, v in sorted(gauges.items()):
+            lines.append(f'{prefix}_gauge{{gauge="{gauge}"}} {v}')
+        lines += [f"# HELP {prefix}_run_start_time_seconds Unix time the run started.", f"# TYPE {prefix}_run_start_time_seconds gauge",
+                  f"{prefix}_run_start_time_seconds {started:.3f}"]
+        return "\n".join(lines) + "\n"
+
+recorder = Recorder()
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as one span of `name`. An exception marks it 'error' and is re-raised."""
+    parent = _current.get()
+    s = Span(name, parent.name if parent else None, **attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.outcome = "timeout" if "Timeout" in type(e).__name__ else "error"
+        s.attrs['error'] = str(e)[:200]
+        raise
+    finally:
+        _current.reset(token)
+        recorder.finish(s)
+
+def current():
+    """The innermost open span, for adding counters from helper code."""
+    return _current.get()
+
+def _write(path, text):
+    # Atomic, so a collector never reads half a file
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=folder)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def start_run(name, **info):
+    """Reset the recorder for a new run and return its report path under runs/."""
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    recorder.reset(dict(info, name=name, id=f"{name}-{stamp}"))
+    return os.path.join(RUNS_DIR, f"{name}-{stamp}.json")
+
+def write_report(path):
+    _write(path, json.dumps(recorder.report(), indent=1))
+    logging.info(f"Run report written to {path}")
+
+def write_prometheus(path=os.path.join(RUNS_DIR, "metrics.prom")):
+    _write(path, recorder.prometheus())
+
+def log_summary(limit=10):
+    rows = recorder.summary()
+    if not rows:
+        return
+    logging.info("Stages (most total time first):")
+    for r in rows[:limit]:
+        failed = sum(n for o, n in r['outcomes'].items() if o != "ok")
+        counters = ", ".join(f"{k}={v}" for k, v in list(r['counters'].items()) + list(r['gauges'].items()))
+        logging.info(f"  {r['stage']:<18} {r['count']:>5}x total {r['total']:8.2f}s mean {r['mean']:6.2f}s max {r['max']:6.2f}s"
+                     + (f" failed {failed}" if failed else "") + (f" [{counters}]" if counters else ""))
+
+class Exporter:
+    """Rewrites the Prometheus snapshot every interval seconds, for a textfile collector to scrape during long runs."""
+
+    def __init__(self, path=os.path.join(RUNS_DIR, "metrics.prom"), interval=30):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                write_prometheus(self.path)
+            except Exception as e:
+                logging.warning(f"Could not write metrics snapshot: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        write_prometheus(self.path)
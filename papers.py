@@ -0,0 +1,489 @@
+import os
+import re
+import sys
+import json
+import logging
+import argparse
+from collections import namedtuple
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+from waits import WaitProfiler
+from artifacts import step
+from request_filters import PROFILES, configure_chrome, apply_selenium, report_selenium
+from http_backend import make_session, results_from_anchors, series_from_anchors, SERIES_RE
+from widget_api import WidgetApi, PAST_PAPERS_URL
+from taxonomy import is_deep_link
+
+# One discovered document. Series rows are yielded contiguously, in page order.
+Document = namedtuple("Document", "qualification subject series title href")
+
+waits = WaitProfiler()
+
+# Request-filter profile for drivers started here: "full", "minimal" or "widget-only"
+FILTER_PROFILE = "minimal"
+
+# Chrome flags for long runs: one renderer, no background services, a small cache
+LOW_MEMORY_ARGS = [
+    '--renderer-process-limit=1',
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disk-cache-size=1048576',
+    '--js-flags=--max-old-space-size=256',
+]
+
+RESULTS_XPATH = "//div[@id='resultsTable']//a[contains(@class, 'result-item')]"
+
+# Every anchor under a selector (the whole document without one) as {href, classes, text, title},
+# gathered in one round trip instead of several WebDriver calls per link
+ANCHORS_JS = r"""
+    var root = arguments[0] ? document.querySelector(arguments[0]) : document;
+    if (!root) return [];
+    function clean(s) { return (s || '').replace(/\s+/g, ' ').trim(); }
+    return Array.from(root.querySelectorAll('a')).map(function(a) {
+        var title = a.querySelector('.doc-title');
+        return {
+            href: a.href || '',
+            classes: Array.from(a.classList),
+            text: clean(a.innerText || a.textContent),
+            title: title ? clean(title.innerText || title.textContent) : null
+        };
+    });
+"""
+
+SERIES_LIST_JS = r"""
+    return Array.from(document.querySelectorAll('#step3 a')).some(function(a) {
+        return /(June|January|November|Summer|Winter)\s*20\d{2}/i.test(a.innerText);
+    });
+"""
+
+RESULTS_READY_JS = """
+    return document.querySelectorAll("a.result-item, a[href*='.pdf']").length > 0;
+"""
+
+SPEC_MODAL_JS = """
+    var target = arguments[0];
+    return Array.from(document.querySelectorAll('h3')).some(function(h) {
+        return h.textContent.includes(target) && h.closest('a') !== null;
+    });
+"""
+
+SPEC_CLICK_JS = """
+    var targetText = arguments[0];
+    var headers = document.querySelectorAll('h3');
+    for (var i = 0; i < headers.length; i++) {
+        if (headers[i].textContent.includes(targetText)) {
+            var link = headers[i].closest('a');
+            if (link) {
+                link.style.border = '5px solid red';
+                link.style.backgroundColor = 'yellow';
+                link.click();
+                var clickEvent = new MouseEvent('click', {'view': window, 'bubbles': true, 'cancelable': true});
+                link.dispatchEvent(clickEvent);
+                return true;
+            }
+        }
+    }
+    return false;
+"""
+
+def setup_driver(profile=None, low_memory=False, headless=False):
+    options = webdriver.ChromeOptions()
+    # Visible unless asked otherwise, so the user can watch the widget
+    if headless:
+        options.add_argument('--headless=new')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--window-size=1280,800')
+    options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+    if low_memory:
+        for arg in LOW_MEMORY_ARGS:
+            options.add_argument(arg)
+
+    # Using cached driver if available
+    driver_path = r"C:\Users\sheha\.wdm\drivers\chromedriver\win64\144.0.7559.96\chromedriver-win32\chromedriver.exe"
+    if not os.path.exists(driver_path):
+        service = Service(ChromeDriverManager().install())
+    else:
+        service = Service(driver_path)
+    profile = profile or FILTER_PROFILE
+    configure_chrome(options, profile)
+    driver = webdriver.Chrome(service=service, options=options)
+    apply_selenium(driver, profile)
+    return driver
+
+def safe_click(driver, element, name="Element"):
+    try:
+        driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", element)
+        if not waits.wait(driver, "safe_click", EC.element_to_be_clickable(element), default=5):
+            raise TimeoutError(f"{name} not clickable")
+        element.click()
+        logging.info(f"Clicked {name}")
+        return True
+    except:
+        try:
+            driver.execute_script("arguments[0].click();", element)
+            logging.info(f"Clicked {name} (JS)")
+            return True
+        except Exception as e:
+            logging.error(f"Failed to click {name}: {e}")
+            return False
+
+def qualification_xpath(qualification):
+    return f"//div[contains(@class, 'findpastpapers')]//*[contains(text(), '{qualification}') and not(ancestor::select)]"
+
+def letter_xpath(letter):
+    return f"//div[contains(@class, 'findpastpapers')]//li[(text()='{letter}' or normalize-space(.)='{letter}')]"
+
+def warm_driver(driver):
+    """Load the past-papers page and accept cookies, leaving the widget at Step 1."""
+    with step(driver, "page_load"):
+        driver.get(PAST_PAPERS_URL)
+    logging.info("Page loaded")
+
+    # Cookie banner
+    with step(driver, "cookie_banner") as s:
+        try:
+            cookie_btn = WebDriverWait(driver, 10).until(EC.element_to_be_clickable((By.ID, "onetrust-accept-btn-handler")))
+            cookie_btn.click()
+            waits.wait(driver, "widget.cookie_banner", EC.invisibility_of_element_located((By.ID, "onetrust-accept-btn-handler")), default=2)
+        except:
+            s.fail("absent")
+    with step(driver, "widget_ready"):
+        WebDriverWait(driver, 20).until(EC.presence_of_element_located((By.CLASS_NAME, "findpastpapers")))
+    driver.widget_qualification = None
+
+def select_qualification(driver, qualification, letter):
+    logging.info(f"Step 1: Selecting {qualification}...")
+    with step(driver, "qualification", qualification=qualification) as s:
+        qual = WebDriverWait(driver, 20).until(EC.visibility_of_element_located((By.XPATH, qualification_xpath(qualification))))
+        safe_click(driver, qual, qualification)
+
+        # Some qualifications open on the "Previous qualifications" tab
+        try:
+            current_tab = driver.find_element(By.XPATH, "//div[contains(@class, 'findpastpapers')]//a[contains(text(), 'Current qualifications')]")
+            if current_tab.is_displayed():
+                safe_click(driver, current_tab, "Current qualifications tab")
+        except: pass
+        ok = waits.wait(driver, "widget.qualification", EC.visibility_of_element_located((By.XPATH, letter_xpath(letter))), default=3)
+        if not ok:
+            s.fail("timeout")
+    # Remember what the page has selected so reset_widget knows whether Step 1 can be skipped
+    driver.widget_qualification = qualification if ok else None
+    return ok
+
+def reset_widget(driver, qualification, letter):
+    """Put an already loaded widget back to "qualification selected, letter open" without a reload.
+
+    Returns False if the page is not the past-papers page or the state could
+    not be reached, in which case the caller should load the page again.
+    """
+    if not driver.current_url.startswith(PAST_PAPERS_URL):
+        return False
+    with step(driver, "reset_widget") as s:
+        ok = _reset_widget(driver, qualification, letter)
+        if not ok:
+            s.fail()
+    return ok
+
+def _reset_widget(driver, qualification, letter):
+    try:
+        # Close the specification modal if a previous subject left it open
+        ActionChains(driver).send_keys(Keys.ESCAPE).perform()
+
+        letters = [l for l in driver.find_elements(By.XPATH, letter_xpath(letter)) if l.is_displayed()]
+        if not letters or getattr(driver, "widget_qualification", None) != qualification:
+            # Re-open Step 1 and pick the qualification again
+            for header in driver.find_elements(By.XPATH, "//div[@id='step1']//h3"):
+                if header.is_displayed():
+                    safe_click(driver, header, "Step 1 Header to Reset")
+                    break
+            if not select_qualification(driver, qualification, letter):
+                return False
+            letters = driver.find_elements(By.XPATH, letter_xpath(letter))
+        safe_click(driver, letters[0], f"Alphabet {letter}")
+        logging.info(f"Reset widget to {qualification} / {letter} without reloading")
+        return True
+    except Exception as e:
+        logging.info(f"In-page reset failed, reloading: {e}")
+        return False
+
+def open_subject(driver, qualification, subject, spec=None, reuse=True):
+    """Select qualification -> letter -> subject (-> spec in the modal).
+
+    With reuse, a page that is already loaded is reset in place instead of
+    being reloaded and re-consented.
+    """
+    wait = WebDriverWait(driver, 20)
+    letter = subject[0].upper()
+    sub_xpath = f"//div[contains(@class, 'findpastpapers')]//a[contains(normalize-space(.), '{subject}')]"
+
+    if not (reuse and reset_widget(driver, qualification, letter)):
+        warm_driver(driver)
+        select_qualification(driver, qualification, letter)
+
+        # Step 2: Select the letter
+        with step(driver, "letter", letter=letter):
+            alphabet = wait.until(EC.presence_of_element_located((By.XPATH, letter_xpath(letter))))
+            safe_click(driver, alphabet, f"Alphabet {letter}")
+
+    # Step 2: Select the subject
+    logging.info(f"Step 2: Selecting {subject}...")
+    with step(driver, "subject", subject=subject):
+        waits.wait(driver, "widget.letter", EC.visibility_of_element_located((By.XPATH, sub_xpath)), default=5)
+
+        subject_link = wait.until(EC.visibility_of_element_located((By.XPATH, sub_xpath)))
+        # Prefer an exact match so "Mathematics" does not pick "Further Mathematics"
+        for link in driver.find_elements(By.XPATH, sub_xpath):
+            if link.text.strip().lower() == subject.lower() and link.is_displayed():
+                subject_link = link
+                break
+        safe_click(driver, subject_link, subject)
+
+    # Step 2.5: Handle the specification modal
+    if spec:
+        logging.info(f"Checking for specification modal for {subject}...")
+        with step(driver, "spec_modal", spec=spec) as s:
+            try:
+                waits.wait(driver, "widget.spec_modal", lambda d: d.execute_script(SPEC_MODAL_JS, spec), default=6)
+                if driver.execute_script(SPEC_CLICK_JS, spec):
+                    logging.info("Target link found and clicked via aggressive JS.")
+                else:
+                    logging.warning(f"Aggressive JS could not find {spec} link for {subject}.")
+                    s.fail("not_found")
+            except Exception as modal_err:
+                logging.info(f"Modal handling error for {subject}: {modal_err}")
+                s.fail()
+
+    with step(driver, "series_list") as s:
+        if not waits.wait(driver, "widget.series_list", lambda d: d.execute_script(SERIES_LIST_JS), default=10):
+            s.fail("timeout")
+
+def follow_link(driver, url, ready_js, timeout=5):
+    """Load a cached deep link and wait briefly for ready_js. The widget state is unknown afterwards."""
+    with step(driver, "deep_link") as s:
+        driver.get(url)
+        driver.widget_qualification = None
+        # The banner only covers the page, so dismiss it if it is there but do not wait for it
+        try:
+            for btn in driver.find_elements(By.ID, "onetrust-accept-btn-handler"):
+                if btn.is_displayed(): btn.click()
+        except: pass
+        ok = waits.wait(driver, "widget.deep_link", lambda d: d.execute_script(ready_js), default=timeout)
+        if not ok:
+            s.fail("stale")
+    return ok
+
+def open_subject_cached(driver, taxonomy, qualification, subject, spec=None):
+    """open_subject through the taxonomy: one navigation when the subject has a cached deep link, else clicks.
+
+    Either way the entry is refreshed from the series list the page shows.
+    """
+    entry = taxonomy.get(qualification, subject, spec)
+    if entry and is_deep_link(entry['url']):
+        cached = {x['label'] for x in entry['series']}
+        # Cheap validation: the page must list at least one of the series we remember
+        if follow_link(driver, entry['url'], SERIES_LIST_JS) and cached & set(list_series(driver)):
+            taxonomy.hit(True)
+            logging.info(f"Opened {subject} from the taxonomy cache")
+            return
+        taxonomy.hit(False)
+        taxonomy.invalidate(qualification, subject, spec)
+    open_subject(driver, qualification, subject, spec)
+    try:
+        series = series_from_anchors(driver.execute_script(ANCHORS_JS, "#step3"), driver.current_url)
+        if series:
+            taxonomy.record(qualification, subject, spec, driver.current_url, series)
+    except Exception as e:
+        logging.info(f"Could not cache the taxonomy for {subject}: {e}")
+
+def read_series_link(driver, href, series_name):
+    """Results of a series read straight from its cached link, or None if the link no longer leads to them."""
+    if not follow_link(driver, href, RESULTS_READY_JS):
+        return None
+    with step(driver, "extract", series=series_name) as e:
+        anchors = driver.execute_script(ANCHORS_JS, None)
+        found = results_from_anchors(anchors, driver.current_url)
+        e.add("anchors", len(anchors))
+        e.add("links", len(found))
+    return found or None
+
+def list_series(driver):
+    try:
+        return [s['label'] for s in series_from_anchors(driver.execute_script(ANCHORS_JS, "#step3"))]
+    except Exception as e:
+        logging.error(f"Error extracting series links: {e}")
+        return []
+
+def iter_series_results(driver, series_name):
+    """Open one series in #step3 and return its result rows as {'href', 'title'}."""
+    with step(driver, "series", series=series_name) as s:
+        target_link = driver.find_element(By.XPATH, f"//div[@id='step3']//a[contains(translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{series_name.lower()}')]")
+        previous = driver.find_elements(By.XPATH, RESULTS_XPATH)
+        safe_click(driver, target_link, series_name)
+        waits.wait(driver, "widget.results",
+                   lambda d: (not previous or EC.staleness_of(previous[0])(d)) and d.find_elements(By.XPATH, RESULTS_XPATH),
+                   default=5)
+        try:
+            WebDriverWait(driver, 15).until(EC.presence_of_element_located((By.ID, "resultsTable")))
+        except:
+            logging.info(f"No results table for {series_name}; reading PDF links instead")
+            s.fail("no_table")
+
+    # One script call returns every anchor; pages without the results table fall back to their PDF links
+    with step(driver, "extract", series=series_name) as e:
+        anchors = driver.execute_script(ANCHORS_JS, "#resultsTable")
+        if not any("result-item" in a['classes'] for a in anchors):
+            anchors = driver.execute_script(ANCHORS_JS, None)
+        found = results_from_anchors(anchors, driver.current_url)
+        e.add("anchors", len(anchors))
+        e.add("links", len(found))
+    for r in found:
+        logging.info(f"Link found: {r['title']}")
+    return found
+
+def reset_series(driver):
+    """Go back to Step 3 for the next series."""
+    with step(driver, "series_reset") as s:
+        try:
+            step3_header = driver.find_element(By.XPATH, "//div[@id='step3']//h3")
+            safe_click(driver, step3_header, "Step 3 Header to Reset")
+            waits.wait(driver, "widget.series_reset", EC.visibility_of_element_located((By.XPATH, "//div[@id='step3']//a")), default=2)
+        except:
+            s.fail()
+
+def _series_predicate(series_filter):
+    if series_filter is None:
+        return lambda name: True
+    if isinstance(series_filter, str):
+        pattern = re.compile(series_filter, re.IGNORECASE)
+        return lambda name: bool(pattern.search(name))
+    return series_filter
+
+def iter_http_documents(session, qualification, subject, spec=None, series_filter=None, done=None, seen=None):
+    """Yield a subject's Documents from the captured endpoints.
+
+    Series read in full are added to done and every yielded (series, href)
+    to seen, so a browser fallback can carry on without repeating either.
+    """
+    api = WidgetApi.load(session)
+    for series_name, results in api.iter_series_documents(qualification, subject, spec=spec, series_filter=series_filter):
+        for r in results:
+            if seen is not None:
+                seen.add((series_name, r['href']))
+            yield Document(qualification, subject, series_name, r['title'], r['href'])
+        if done is not None:
+            done.add(series_name)
+
+def unseen(docs, seen):
+    """docs without those already yielded by an earlier pass (see iter_http_documents)."""
+    for doc in docs:
+        if (doc.series, doc.href) not in seen:
+            yield doc
+
+def iter_browser_documents(driver, qualification, subject, spec=None, series_filter=None, taxonomy=None):
+    """Yield a subject's Documents by driving the widget; with a taxonomy, series with cached deep links are loaded directly."""
+    done = set()
+    entry = taxonomy.get(qualification, subject, spec) if taxonomy else None
+    if entry:
+        targets = [x for x in entry['series'] if series_filter(x['label'])]
+        # Nothing wanted in the cached list may only mean the cache predates a new series, so that opens the subject
+        if targets and all(is_deep_link(x['href']) for x in targets):
+            logging.info(f"Reading {len(targets)} series of {subject} from cached links")
+            for x in targets:
+                rows = read_series_link(driver, x['href'], x['label'])
+                taxonomy.hit(rows is not None)
+                if rows is None:
+                    taxonomy.invalidate(qualification, subject, spec)
+                    break
+                for r in rows:
+                    yield Document(qualification, subject, x['label'], r['title'], r['href'])
+                done.add(x['label'])
+            else:
+                return
+
+    if taxonomy is not None:
+        open_subject_cached(driver, taxonomy, qualification, subject, spec)
+    else:
+        open_subject(driver, qualification, subject, spec)
+    series_data = [s for s in list_series(driver) if series_filter(s) and s not in done]
+    logging.info(f"Found {len(series_data)} target exam series: {series_data}")
+    for series_name in series_data:
+        logging.info(f"--- Processing Series: {series_name} ---")
+        try:
+            for r in iter_series_results(driver, series_name):
+                yield Document(qualification, subject, series_name, r['title'], r['href'])
+        except Exception as e:
+            logging.error(f"Error processing series {series_name}: {e}")
+        reset_series(driver)
+
+def iter_documents(qualification, subject, series_filter=None, spec=None, backend="auto", session=None, driver=None, pool=None,
+                   taxonomy=None):
+    """Yield a Document for every result row of a subject, as soon as it is read.
+
+    backend is "http" (captured widget endpoints only), "browser" (Selenium
+    only) or "auto" (HTTP first, then the browser for any series the HTTP
+    path could not serve). series_filter is a regex string or a callable
+    taking the series name. If the browser is needed and no driver is
+    passed in, one is checked out of pool (a BrowserPool) or, without a
+    pool, started and quit on demand. A Taxonomy lets the browser jump to
+    cached deep links instead of clicking through the widget.
+    """
+    predicate = _series_predicate(series_filter)
+    done = set()
+    seen = set()
+
+    if backend in ("http", "auto"):
+        try:
+            yield from iter_http_documents(session or make_session(), qualification, subject, spec, predicate, done, seen)
+            return
+        except Exception as e:
+            if backend == "http":
+                raise
+            logging.warning(f"HTTP backend failed for {subject} ({e}); falling back to the browser")
+
+    # A series the HTTP pass broke off in is read again by the browser; its rows already yielded are not repeated
+    remaining = lambda s: predicate(s) and s not in done
+    if driver is not None:
+        yield from unseen(iter_browser_documents(driver, qualification, subject, spec, remaining, taxonomy), seen)
+    elif pool is not None:
+        with pool.driver() as pooled:
+            yield from unseen(iter_browser_documents(pooled, qualification, subject, spec, remaining, taxonomy), seen)
+    else:
+        driver = setup_driver()
+        try:
+            yield from unseen(iter_browser_documents(driver, qualification, subject, spec, remaining, taxonomy), seen)
+        finally:
+            report_selenium(driver)
+            driver.quit()
+
+if __name__ == "__main__":
+    # Stream discovered documents as JSON Lines on stdout; logs go to stderr
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="List past-paper documents as JSON Lines")
+    parser.add_argument("--qualification", default="International GCSE")
+    parser.add_argument("--subject", action="append", help="may be repeated (default: Mathematics B)")
+    parser.add_argument("--spec", default="(2016)")
+    parser.add_argument("--series", help="regex the series name must match")
+    parser.add_argument("--backend", choices=["auto", "http", "browser"], default="auto")
+    parser.add_argument("--filter", choices=sorted(PROFILES), default=FILTER_PROFILE, help="request-filter profile for the browser")
+    args = parser.parse_args()
+    FILTER_PROFILE = args.filter
+
+    try:
+        for subject in args.subject or ["Mathematics B"]:
+            for doc in iter_documents(args.qualification, subject, series_filter=args.series, spec=args.spec, backend=args.backend):
+                sys.stdout.write(json.dumps(doc._asdict()) + "\n")
+                sys.stdout.flush()
+    except BrokenPipeError:
+        # Downstream closed the pipe (e.g. `| head`)
+        pass
+    finally:
+        waits.finish()
@@ -0,0 +1,248 @@
+import time
+import random
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+# Worth another attempt; 429 and 503 also mean the host wants us to slow down
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+THROTTLE_STATUSES = (429, 503)
+RETRIES = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+# Smoothed time to response headers this many times the host's baseline counts as overload
+LATENCY_FACTOR = 3.0
+RATE_STEP = 0.5
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+def retry_delay(attempt, retry_after=None, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    """Full-jitter exponential backoff for attempt 0, 1, 2, ...; Retry-After wins when the server sends one."""
+    wait = parse_retry_after(retry_after)
+    if wait is not None:
+        return min(wait, cap) + random.uniform(0, base)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class HostLimit:
+    """Token bucket plus an AIMD concurrency limit for one host.
+
+    acquire() blocks until the host has a free slot and a token. observe()
+    feeds back each response: 429/503 halve the concurrency limit (429 the
+    rate as well) and pause the host for Retry-After, at most once per
+    round trip; a smoothed latency well above the host's baseline cuts the
+    limit by 30%; every healthy response grows the limit by 1/limit (one
+    per round of successful requests) and the rate by RATE_STEP requests
+    per second. Until the host first pushes
+    back the rate grows by 10% per response instead (slow start), so a
+    healthy host is not held at the initial rate.
+    """
+
+    def __init__(self, host, rate=32.0, concurrency=4, max_concurrency=16, min_rate=0.5, max_rate=256.0):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.limit = float(concurrency)
+        self.max_concurrency = max_concurrency
+        self.tokens = float(max(1, concurrency))
+        self.refilled = time.monotonic()
+        self.paused_until = 0.0
+        self.active = 0
+        self.smooth = None
+        self.baseline = None
+        self.last_decrease = 0.0
+        self.slow_start = True
+        self.requests = 0
+        self.throttled = 0
+        self.cond = threading.Condition()
+
+    def _refill(self, now):
+        burst = max(1.0, self.limit)
+        self.tokens = min(burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def acquire(self):
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.cond.wait(self.paused_until - now)
+                    continue
+                if self.active >= max(1, int(self.limit)):
+                    self.cond.wait()
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.active += 1
+                    self.requests += 1
+                    return
+                self.cond.wait((1 - self.tokens) / self.rate)
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def _decrease(self, factor, now):
+        # At most once per smoothed round trip, so one burst of 429s is one back-off
+        if now - self.last_decrease < max(self.smooth or 0, 1.0):
+            return False
+        self.last_decrease = now
+        self.slow_start = False
+        self.limit = max(1.0, self.limit * factor)
+        return True
+
+    def observe(self, status, latency, retry_after=None):
+        """Feed back one response (status None for a connection error or timeout)."""
+        now = time.monotonic()
+        with self.cond:
+            if status in THROTTLE_STATUSES or status is None:
+                self.throttled += 1
+                if self._decrease(0.5, now):
+                    # 429 is about our request rate; 503 and dropped connections only about concurrency
+                    if status == 429:
+                        self.rate = max(self.min_rate, self.rate * 0.5)
+                    logging.warning(f"{self.host} is throttling ({status or 'no response'}); concurrency {self.limit:.1f}, {self.rate:.1f} req/s")
+                    # The whole host waits out Retry-After once per back-off; the retried request always does
+                    wait = parse_retry_after(retry_after)
+                    if wait:
+                        self.paused_until = max(self.paused_until, now + min(wait, BACKOFF_CAP))
+                return
+            if latency is not None:
+                self.smooth = latency if self.smooth is None else self.smooth * 0.8 + latency * 0.2
+                # The baseline follows the fastest responses and only drifts up slowly
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline + (latency - self.baseline) * 0.01)
+                if self.smooth > self.baseline * LATENCY_FACTOR and self._decrease(0.7, now):
+                    logging.info(f"{self.host} is slowing down ({self.smooth:.2f}s vs {self.baseline:.2f}s); concurrency {self.limit:.1f}")
+                    return
+            if status is not None and status < 400:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate * 1.1 if self.slow_start else self.rate + RATE_STEP)
+            self.cond.notify_all()
+
+    def gauges(self):
+        return {'concurrency': round(self.limit, 2), 'in_flight': self.active, 'rate': round(self.rate, 2)}
+
+class Throttle:
+    """Per-host HostLimits shared by every session that mounts a ThrottledAdapter."""
+
+    def __init__(self, rate=32.0, concurrency=4, max_concurrency=16, retries=RETRIES):
+        self.rate = rate
+        self.concurrency = concurrency
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            if host not in self.hosts:
+                self.hosts[host] = HostLimit(host, self.rate, self.concurrency, self.max_concurrency)
+            return self.hosts[host]
+
+    def gauges(self):
+        """Current concurrency limit, requests in flight and rate, summed over hosts, for the metrics recorder."""
+        with self.lock:
+            hosts = list(self.hosts.values())
+        gauges = {}
+        for h in hosts:
+            for k, v in h.gauges().items():
+                gauges[f"http_{k}"] = round(gauges.get(f"http_{k}", 0) + v, 2)
+        return gauges
+
+    def stats(self):
+        with self.lock:
+            hosts = list(self.hosts.values())
+        return {h.host: dict(h.gauges(), requests=h.requests, throttled=h.throttled) for h in hosts}
+
+def throttled(throttle, method, url, send, stream=False):
+    """Make one request through throttle: wait for a slot, call send(), feed back the result, retry what is worth retrying.
+
+    send() makes one attempt and returns a response with status_code,
+    headers and close(), or raises requests' ConnectionError / Timeout. A
+    streamed response keeps its host slot until it is closed, so the
+    concurrency limit covers the body as well as the headers.
+    """
+    host = throttle.host(url)
+    attempt = 0
+    while True:
+        host.acquire()
+        started = time.perf_counter()
+        try:
+            response = send()
+        except (ConnectionError, Timeout) as e:
+            host.release()
+            host.observe(None, None)
+            if attempt >= throttle.retries:
+                raise
+            delay = retry_delay(attempt)
+            logging.warning(f"{method} {url} failed ({e}); retry {attempt + 1} in {delay:.1f}s")
+        except BaseException:
+            host.release()
+            raise
+        else:
+            host.observe(response.status_code, time.perf_counter() - started, response.headers.get("Retry-After"))
+            if response.status_code not in RETRY_STATUSES or attempt >= throttle.retries:
+                if stream:
+                    _release_on_close(response, host)
+                else:
+                    host.release()
+                return response
+            delay = retry_delay(attempt, response.headers.get("Retry-After"))
+            logging.warning(f"{method} {url} returned {response.status_code}; retry {attempt + 1} in {delay:.1f}s")
+            response.close()
+            host.release()
+        attempt += 1
+        time.sleep(delay)
+
+def _release_on_close(response, host):
+    close = response.close
+    released = []
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            if not released:
+                released.append(True)
+                host.release()
+    response.close = close_and_release
+
+class ThrottledAdapter(HTTPAdapter):
+    """An HTTPAdapter that sends every request of a requests session through a Throttle."""
+
+    def __init__(self, throttle, **kwargs):
+        self.throttle = throttle
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        return throttled(self.throttle, request.method, request.url,
+                         lambda: super(ThrottledAdapter, self).send(request, stream=stream, **kwargs), stream)
+
+def mount(session, throttle, pool_size=10):
+    """Route every http(s) request of session through throttle."""
+    if not isinstance(session, requests.Session):
+        # Other transports (transport.HttpxSession) call throttled() themselves
+        session.throttle = throttle
+        return session
+    adapter = ThrottledAdapter(throttle, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
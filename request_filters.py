@@ -0,0 +1,237 @@
+import os
+import re
+import logging
+import threading
+from urllib.parse import urlparse
+
+# The simulated site (PAST_PAPERS_URL override) counts as first party too
+FIRST_PARTY = ("pearson.com", urlparse(os.environ.get("PAST_PAPERS_URL", "")).hostname or "pearson.com")
+
+TRACKER_PATTERNS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googleadservices.com",
+    "facebook.net", "facebook.com/tr", "hotjar.com", "linkedin.com/px", "licdn.com", "bat.bing.com",
+    "clarity.ms", "newrelic.com", "nr-data.net", "optimizely.com", "demdex.net", "omtrdc.net",
+    "adobedtm.com", "qualtrics.com", "youtube.com", "vimeo.com",
+]
+CONSENT_PATTERNS = ["cookielaw.org", "onetrust.com", "otSDKStub", "otBannerSdk"]
+
+HEAVY_EXTENSIONS = [
+    "png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico",
+    "woff", "woff2", "ttf", "otf", "eot",
+    "mp4", "webm", "mp3", "m4a", "ogg",
+]
+
+# Typical transfer sizes, used to estimate what a blocked request would have cost
+ESTIMATED_BYTES = {
+    'image': 60 * 1024, 'font': 40 * 1024, 'media': 500 * 1024,
+    'script': 80 * 1024, 'stylesheet': 30 * 1024, 'other': 10 * 1024,
+}
+
+# "full" blocks nothing (the original behaviour). "minimal" drops only what
+# no scraper ever reads: images, fonts, media and analytics. "widget-only"
+# also drops every third-party request, including the OneTrust consent
+# bundle, so only the Pearson page and the findpastpapers widget load.
+PROFILES = {
+    'full': {'types': set(), 'patterns': [], 'third_party': False},
+    'minimal': {'types': {'image', 'font', 'media'}, 'patterns': TRACKER_PATTERNS, 'third_party': False},
+    'widget-only': {'types': {'image', 'font', 'media'}, 'patterns': TRACKER_PATTERNS + CONSENT_PATTERNS, 'third_party': True},
+}
+
+def _guess_type(url):
+    path = urlparse(url).path.lower()
+    ext = path.rsplit(".", 1)[-1] if "." in path else ""
+    if ext in ("woff", "woff2", "ttf", "otf", "eot"): return 'font'
+    if ext in ("mp4", "webm", "mp3", "m4a", "ogg"): return 'media'
+    if ext in HEAVY_EXTENSIONS: return 'image'
+    if ext == "js": return 'script'
+    if ext == "css": return 'stylesheet'
+    return 'other'
+
+def is_first_party(url):
+    host = urlparse(url).hostname or ""
+    return any(host == d or host.endswith("." + d) for d in FIRST_PARTY)
+
+class RequestFilter:
+    """Decides which requests a profile blocks and counts what it saved."""
+
+    def __init__(self, profile="minimal"):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown filter profile {profile!r}; choose from {sorted(PROFILES)}")
+        self.profile = profile
+        self.rules = PROFILES[profile]
+        self.lock = threading.Lock()
+        self.blocked = 0
+        self.allowed = 0
+        self.bytes_saved = 0
+        self.bytes_loaded = 0
+        self.by_type = {}
+
+    def should_block(self, url, resource_type=None):
+        if url.startswith("data:") or url.lower().split("?")[0].endswith(".pdf"):
+            return False
+        resource_type = resource_type or _guess_type(url)
+        if resource_type in self.rules['types']:
+            return True
+        if any(p in url for p in self.rules['patterns']):
+            return True
+        if self.rules['third_party'] and resource_type not in ('document',) and not is_first_party(url):
+            return True
+        return False
+
+    def count_blocked(self, url, resource_type=None):
+        resource_type = resource_type or _guess_type(url)
+        with self.lock:
+            self.blocked += 1
+            self.bytes_saved += ESTIMATED_BYTES.get(resource_type, ESTIMATED_BYTES['other'])
+            self.by_type[resource_type] = self.by_type.get(resource_type, 0) + 1
+
+    def count_allowed(self, size=0):
+        with self.lock:
+            self.allowed += 1
+            self.bytes_loaded += size
+
+    def selenium_patterns(self):
+        """URL wildcards for CDP Network.setBlockedURLs (it cannot filter by resource type)."""
+        patterns = []
+        if 'image' in self.rules['types']:
+            patterns += [f"*.{ext}*" for ext in HEAVY_EXTENSIONS[:8]]
+        if 'font' in self.rules['types']:
+            patterns += [f"*.{ext}*" for ext in HEAVY_EXTENSIONS[8:13]]
+        if 'media' in self.rules['types']:
+            patterns += [f"*.{ext}*" for ext in HEAVY_EXTENSIONS[13:]]
+        patterns += [f"*{p}*" for p in self.rules['patterns']]
+        return patterns
+
+    def stats(self):
+        with self.lock:
+            return {
+                'profile': self.profile,
+                'blocked': self.blocked,
+                'allowed': self.allowed,
+                'bytes_loaded': self.bytes_loaded,
+                'estimated_bytes_saved': self.bytes_saved,
+                'blocked_by_type': dict(self.by_type),
+            }
+
+    def report(self):
+        s = self.stats()
+        logging.info(f"Request filter '{s['profile']}': blocked {s['blocked']} requests "
+                     f"(~{s['estimated_bytes_saved'] / 1024 / 1024:.1f} MB saved), allowed {s['allowed']} "
+                     f"({s['bytes_loaded'] / 1024 / 1024:.1f} MB loaded) {s['blocked_by_type']}")
+        return s
+
+# --- Selenium ---------------------------------------------------------------
+
+def configure_chrome(options, profile="minimal"):
+    """Chrome prefs for a profile; call on ChromeOptions before the driver starts."""
+    rules = PROFILES[profile]
+    if 'image' in rules['types']:
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    # Performance logs let collect_selenium() count blocked and loaded requests
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+def apply_selenium(driver, profile="minimal"):
+    """Block a profile's URLs through CDP. The filter is kept on driver.request_filter."""
+    filt = RequestFilter(profile)
+    driver.request_filter = filt
+    patterns = filt.selenium_patterns()
+    if patterns:
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+            logging.info(f"Request filter '{profile}': blocking {len(patterns)} URL patterns")
+        except Exception as e:
+            logging.warning(f"Could not apply request filter via CDP: {e}")
+    return filt
+
+def collect_selenium(driver):
+    """Fold the driver's pending performance log into its filter counters."""
+    filt = getattr(driver, "request_filter", None)
+    if filt is None:
+        return None
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return filt
+    urls = {}
+    for entry in entries:
+        message = entry.get("message", "")
+        if '"Network.' not in message:
+            continue
+        m = re.search(r'"method":"(Network\.[a-zA-Z]+)"', message)
+        method = m.group(1) if m else ""
+        rid = re.search(r'"requestId":"([^"]+)"', message)
+        rid = rid.group(1) if rid else None
+        if method == "Network.requestWillBeSent":
+            u = re.search(r'"url":"([^"]+)"', message)
+            if u and rid: urls[rid] = u.group(1)
+        elif method == "Network.loadingFailed" and '"blockedReason"' in message:
+            filt.count_blocked(urls.get(rid, ""))
+        elif method == "Network.loadingFinished":
+            size = re.search(r'"encodedDataLength":([0-9.]+)', message)
+            filt.count_allowed(int(float(size.group(1))) if size else 0)
+    return filt
+
+def report_selenium(driver):
+    filt = collect_selenium(driver)
+    return filt.report() if filt else None
+
+# --- Playwright -------------------------------------------------------------
+
+def apply_playwright(context, profile="minimal", filt=None):
+    """Route every request of a (sync) Playwright context through a profile.
+
+    Pass filt to share one set of counters between several contexts.
+    """
+    filt = filt or RequestFilter(profile)
+    if filt.profile == "full":
+        return filt
+
+    def handle(route):
+        request = route.request
+        if filt.should_block(request.url, request.resource_type):
+            filt.count_blocked(request.url, request.resource_type)
+            route.abort()
+        else:
+            filt.count_allowed()
+            route.continue_()
+
+    context.route("**/*", handle)
+    context.on("requestfinished", lambda request: _count_size(filt, request))
+    return filt
+
+async def apply_playwright_async(context, profile="minimal", filt=None):
+    """Async Playwright variant of apply_playwright."""
+    filt = filt or RequestFilter(profile)
+    if filt.profile == "full":
+        return filt
+
+    async def handle(route):
+        request = route.request
+        if filt.should_block(request.url, request.resource_type):
+            filt.count_blocked(request.url, request.resource_type)
+            await route.abort()
+        else:
+            filt.count_allowed()
+            await route.continue_()
+
+    await context.route("**/*", handle)
+    context.on("requestfinished", lambda request: _count_size_async(filt, request))
+    return filt
+
+async def _count_size_async(filt, request):
+    try:
+        sizes = await request.sizes()
+        with filt.lock:
+            filt.bytes_loaded += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+    except Exception:
+        pass
+
+def _count_size(filt, request):
+    try:
+        sizes = request.sizes()
+        with filt.lock:
+            filt.bytes_loaded += sizes.get("responseBodySize", 0) + sizes.get("responseHeadersSize", 0)
+    except Exception:
+        pass
@@ -0,0 +1,370 @@
+import re
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PAGE_PATH = "/en/support/support-topics/exams/past-papers.html"
+
+# (qualification, spec label or None, series months, [(subject, code, papers)])
+CATALOG = [
+    ("International GCSE", "(2016)", ["January", "June", "November"], [
+        ("Mathematics A", "4MA1", ["1F", "1H", "2F", "2H"]),
+        ("Mathematics B", "4MB1", ["01", "02"]),
+        ("Physics", "4PH1", ["1P", "2P"]),
+    ]),
+    ("A Level", None, ["June"], [
+        ("Mathematics", "9MA0", ["01", "02", "03"]),
+        ("Further Mathematics", "9FM0", ["01", "02", "03", "04"]),
+    ]),
+]
+YEARS = range(2025, 2016, -1)
+
+PAGE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Past papers | Simulated</title>
+<style>
+@font-face { font-family: Site; src: url(/static/site.woff2) format("woff2"); }
+body { font-family: Site, sans-serif; margin: 0; }
+#onetrust-banner-sdk { position: fixed; bottom: 0; left: 0; right: 0; padding: 16px; background: #eee; }
+.findpastpapers { max-width: 900px; margin: 20px auto; }
+.findpastpapers h3 { cursor: pointer; }
+.alphabet li { display: inline-block; padding: 4px 8px; cursor: pointer; }
+#specModal { position: fixed; top: 20%%; left: 30%%; background: #fff; border: 1px solid #333; padding: 20px; }
+.result-item { display: block; padding: 4px 0; }
+</style></head>
+<body>
+<div id="onetrust-banner-sdk"><p>We use cookies.</p><button id="onetrust-accept-btn-handler">Accept all cookies</button></div>
+<h1>Past papers, mark schemes and examiner reports</h1>
+%(images)s
+<div class="findpastpapers">
+  <div id="step1"><h3>Step 1: Choose a qualification</h3><ul class="options"></ul></div>
+  <div id="step2" style="display:none"><h3>Step 2: Choose a subject</h3>
+    <div class="tabs"><a href="#" class="tab">Current qualifications</a></div>
+    <ul class="alphabet">%(letters)s</ul><div class="subjects"></div></div>
+  <div id="step3" style="display:none"><h3>Step 3: Choose an exam series</h3><div class="series"></div></div>
+  <div id="resultsTable"></div>
+</div>
+<div id="specModal" style="display:none"></div>
+<script>
+var qualification = null;
+function $(sel) { return document.querySelector(sel); }
+function get(url, done, tries) {
+    tries = tries || 0;
+    var x = new XMLHttpRequest();
+    x.open('GET', url);
+    x.onload = function() {
+        if (x.status == 200) done(JSON.parse(x.responseText));
+        else if (tries < 3) setTimeout(function() { get(url, done, tries + 1); }, 500);
+    };
+    x.send();
+}
+function links(container, items, cls, onclick, wrap) {
+    container.innerHTML = '';
+    items.forEach(function(item) {
+        var a = document.createElement('a');
+        a.href = '#';
+        a.className = cls;
+        if (wrap) { var h = document.createElement(wrap); h.textContent = item.name; a.appendChild(h); }
+        else a.textContent = item.name;
+        a.onclick = function(e) { e.preventDefault(); onclick(item); };
+        var li = document.createElement('div');
+        li.appendChild(a);
+        container.appendChild(li);
+    });
+}
+$('#onetrust-accept-btn-handler').onclick = function() {
+    document.cookie = 'OptanonAlertBoxClosed=1; path=/';
+    $('#onetrust-banner-sdk').style.display = 'none';
+};
+get('/api/qualifications', function(data) {
+    links($('#step1 .options'), data, 'qualification', function(q) {
+        qualification = q;
+        $('#step1 .options').style.display = 'none';
+        $('#step2').style.display = '';
+        $('#step2 .subjects').innerHTML = '';
+        $('#step3').style.display = 'none';
+        $('#resultsTable').innerHTML = '';
+    });
+});
+$('#step1 h3').onclick = function() { $('#step1 .options').style.display = ''; };
+$('#step3 h3').onclick = function() {
+    var s = $('#step3 .series');
+    s.style.display = s.style.display == 'none' ? '' : 'none';
+};
+Array.prototype.forEach.call(document.querySelectorAll('.alphabet li'), function(li) {
+    li.onclick = function() {
+        if (!qualification) return;
+        var letter = li.textContent.trim();
+        get('/api/subjects?qualification=' + qualification.id, function(data) {
+            var matching = data.filter(function(s) { return s.name.charAt(0).toUpperCase() == letter; });
+            links($('#step2 .subjects'), matching, 'subject', openSubject);
+        });
+    };
+});
+document.addEventListener('keydown', function(e) { if (e.key == 'Escape') $('#specModal').style.display = 'none'; });
+function openSubject(subject) {
+    $('#step3').style.display = 'none';
+    $('#resultsTable').innerHTML = '';
+    get('/api/specs?subject=' + subject.id, function(specs) {
+        if (!specs.length) return loadSeries(subject);
+        var modal = $('#specModal');
+        links(modal, specs, 'spec', function() { modal.style.display = 'none'; loadSeries(subject); }, 'h3');
+        modal.style.display = '';
+    });
+}
+function loadSeries(subject) {
+    get('/api/series?subject=' + subject.id, function(data) {
+        links($('#step3 .series'), data, 'series', openSeries);
+        $('#step3 .series').style.display = '';
+        $('#step3').style.display = '';
+    });
+}
+function openSeries(series) {
+    $('#step3 .series').style.display = 'none';
+    get('/api/documents?series=' + series.id, function(docs) {
+        $('#resultsTable').innerHTML = docs.map(function(d) {
+            return '<a class="result-item" href="' + d.url + '"><span class="doc-title">' + d.title +
+                   '</span> <span class="doc-size">(PDF | ' + Math.round(d.size / 1024) + ' KB)</span></a>';
+        }).join('');
+    });
+}
+</script>
+</body></html>
+"""
+
+class Site:
+    """The dataset and behaviour knobs of one simulated past-papers site."""
+
+    def __init__(self, scale=100, latency=0.0, jitter=0.0, error_rate=0.0, pdf_kb=64, image_kb=100, images=3, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.pdf_size = pdf_kb * 1024
+        self.image_size = image_kb * 1024
+        self.images = images
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.build(scale)
+
+    def build(self, scale):
+        """Spread `scale` documents (question paper + mark scheme pairs) over every subject's series."""
+        self.qualifications, self.subjects, self.specs, self.series, self.documents = [], {}, {}, {}, {}
+        units = []
+        for qi, (qual, spec, months, subjects) in enumerate(CATALOG):
+            qid = f"q{qi}"
+            self.qualifications.append({'id': qid, 'name': qual})
+            self.subjects[qid] = []
+            for si, (subject, code, papers) in enumerate(subjects):
+                sid = f"s{qi}{si}"
+                self.subjects[qid].append({'id': sid, 'name': subject})
+                self.specs[sid] = [{'id': f"sp{qi}{si}", 'name': f"{subject} {spec}"}] if spec else []
+                self.series[sid] = []
+                for year in YEARS:
+                    for month in reversed(months):
+                        seid = f"se{qi}{si}-{month[:3].lower()}{year}"
+                        name = f"{month} {year}"
+                        self.series[sid].append({'id': seid, 'name': name})
+                        self.documents[seid] = []
+                        units.append((seid, name, code, papers))
+
+        pairs = max(1, scale // 2)
+        count = 0
+        for n in range(pairs):
+            seid, name, code, papers = units[n % len(units)]
+            docs = self.documents[seid]
+            k = len(docs) // 2
+            # Beyond the real papers, add numbered resits (1FR1, 1FR2, ...) so any scale fits
+            paper = papers[k % len(papers)] + (f"R{k // len(papers)}" if k >= len(papers) else "")
+            stamp = name.replace(" ", "")
+            for kind, short in (("Question paper", "que"), ("Mark scheme", "msc")):
+                count += 1
+                did = f"d{count}"
+                docs.append({
+                    'id': did,
+                    'title': f"{kind} - Paper {paper} ({code}/{paper}) - {name}",
+                    'url': f"/pdf/{did}/{code}_{paper}_{short}_{stamp}.pdf",
+                    'size': self.pdf_size,
+                    'type': kind,
+                })
+        self.total = pairs * 2
+        # Drop series that ended up with no documents, like the real widget
+        for sid in self.series:
+            self.series[sid] = [s for s in self.series[sid] if self.documents[s['id']]]
+
+    def delay(self):
+        d = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0)
+        if d > 0:
+            time.sleep(d)
+
+    def fail(self):
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def page(self):
+        letters = "".join(f"<li>{chr(c)}</li>" for c in range(ord("A"), ord("Z") + 1))
+        images = "".join(f'<img src="/static/hero-{i}.png" alt="" width="1" height="1">' for i in range(self.images))
+        return PAGE_HTML % {'letters': letters, 'images': images}
+
+    def api(self, name, params):
+        if name == "qualifications":
+            return self.qualifications
+        if name == "subjects":
+            return self.subjects.get(params.get('qualification', ''))
+        if name == "specs":
+            return self.specs.get(params.get('subject', ''))
+        if name == "series":
+            return self.series.get(params.get('subject', ''))
+        if name == "documents":
+            return self.documents.get(params.get('series', ''))
+        return None
+
+    def pdf_body(self, did):
+        head = f"%PDF-1.4\n% simulated {did}\n".encode()
+        tail = b"\n%%EOF\n"
+        return head + b"0" * max(0, self.pdf_size - len(head) - len(tail)) + tail
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'errors': self.errors, 'bytes_sent': self.bytes_sent, 'documents': self.total}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b"", content_type="text/plain", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        with self.server.site.lock:
+            self.server.site.bytes_sent += len(body)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        site = self.server.site
+        parts = urlsplit(self.path)
+        path = parts.path
+        site.delay()
+
+        if path in ("/", PAGE_PATH):
+            site.fail()
+            return self.send(200, site.page().encode(), "text/html; charset=utf-8")
+
+        if path.startswith("/static/"):
+            site.fail()
+            kind = "font/woff2" if path.endswith(".woff2") else "image/png"
+            return self.send(200, b"\x89PNG\r\n\x1a\n" + b"\0" * site.image_size, kind, {'Cache-Control': 'no-store'})
+
+        if site.fail():
+            return self.send(503, b"Service Unavailable", headers={'Retry-After': '1'})
+
+        m = re.match(r"^/api/(\w+)$", path)
+        if m:
+            params = {k: v[0] for k, v in parse_qs(parts.query).items()}
+            data = site.api(m.group(1), params)
+            if data is None:
+                return self.send(404, b"Not Found")
+            return self.send(200, json.dumps(data).encode(), "application/json")
+
+        m = re.match(r"^/pdf/([^/]+)/[^/]+\.pdf$", path)
+        if m:
+            did = m.group(1)
+            etag = f'"{did}-{site.pdf_size}"'
+            headers = {'ETag': etag, 'Last-Modified': "Mon, 01 Jan 2024 00:00:00 GMT"}
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            return self.send(200, site.pdf_body(did), "application/pdf", headers)
+
+        self.send(404, b"Not Found")
+
+def start(host="127.0.0.1", port=0, **options):
+    """Serve a simulated site on a background thread. Returns (server, page_url); stop with server.shutdown()."""
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.site = Site(**options)
+    threading.Thread(target=server.serve_forever, name="simulator", daemon=True).start()
+    page_url = f"http://{host}:{server.server_address[1]}{PAGE_PATH}"
+    logging.info(f"Simulated site with {server.site.total} documents at {page_url}")
+    return server, page_url
+
+def capture(page_url, qualification, subject, series=None, spec=None, capture_path="widget_capture.json"):
+    """Write a widget capture for the simulator by making the calls its page makes, then inferring the schema.
+
+    Stands in for widget_api.discover, which needs Playwright, so the http
+    backend can be benchmarked against the simulator on any machine.
+    """
+    import requests
+    from widget_api import build_schema
+
+    base = page_url.split("/en/")[0]
+    session = requests.Session()
+    calls = []
+
+    def call(step, path):
+        r = session.get(base + path, timeout=30)
+        calls.append({'step': step, 'method': "GET", 'url': r.url, 'post_data': None, 'status': r.status_code,
+                      'content_type': r.headers.get('Content-Type', ''), 'body': r.text})
+        return r.json() if r.status_code == 200 else []
+
+    def pick(records, label):
+        if not label:
+            return records[0]
+        return next(r for r in records if label.lower() in r['name'].lower())
+
+    q = pick(call("initial", "/api/qualifications"), qualification)
+    s = pick(call("letter", f"/api/subjects?qualification={q['id']}"), subject)
+    call("subject", f"/api/specs?subject={s['id']}")
+    se = pick(call("spec" if spec else "subject", f"/api/series?subject={s['id']}"), series)
+    call("series", f"/api/documents?series={se['id']}")
+
+    labels = {'qualification': qualification, 'subject': subject, 'spec': spec, 'series': se['name']}
+    data = {'captured_at': time.time(), 'labels': labels, 'endpoints': build_schema(calls, labels), 'calls': calls}
+    with open(capture_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    return data
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the past-papers site")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--scale", type=int, default=100, help="number of documents (10 to 10000)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every request")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of API/PDF requests answered with 503")
+    parser.add_argument("--pdf-kb", type=int, default=64)
+    parser.add_argument("--image-kb", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    server, url = start(args.host, args.port, scale=args.scale, latency=args.latency, jitter=args.jitter,
+                        error_rate=args.error_rate, pdf_kb=args.pdf_kb, image_kb=args.image_kb, seed=args.seed)
+    print(f"Serving {url}  (run scrapers with PAST_PAPERS_URL={url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
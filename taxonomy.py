@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from urllib.parse import urlsplit
+from widget_api import PAST_PAPERS_URL
+
+TAXONOMY_PATH = "taxonomy.json"
+
+def is_deep_link(href, page_url=PAST_PAPERS_URL):
+    """True if href carries its own state (another path, a query or a fragment) rather than being the bare widget page."""
+    u, p = urlsplit(href or ""), urlsplit(page_url)
+    if u.scheme not in ("http", "https"):
+        return False
+    return (u.netloc, u.path.rstrip("/"), u.query) != (p.netloc, p.path.rstrip("/"), p.query) or bool(u.fragment)
+
+class Taxonomy:
+    """Persisted map of qualification / subject / spec to where the widget ends up.
+
+    Each entry holds the page URL once the subject is selected and the
+    subject's series as [{'label', 'href'}]. Where those URLs carry widget
+    state (see is_deep_link) the scrapers jump straight to them instead of
+    clicking through the widget. Entries older than ttl seconds are ignored,
+    and a caller that finds one stale invalidates it and clicks instead.
+    """
+
+    def __init__(self, path=TAXONOMY_PATH, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.dirty = False
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+            logging.info(f"Loaded taxonomy with {len(self.entries)} subjects from {self.path}")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable taxonomy {self.path}: {e}")
+
+    def _key(self, qualification, subject, spec=None):
+        return f"{qualification}|{subject}|{spec or ''}"
+
+    def get(self, qualification, subject, spec=None):
+        with self.lock:
+            entry = self.entries.get(self._key(qualification, subject, spec))
+            if entry and time.time() - entry.get('checked_at', 0) < self.ttl:
+                return entry
+            return None
+
+    def record(self, qualification, subject, spec, url, series):
+        with self.lock:
+            self.entries[self._key(qualification, subject, spec)] = {
+                'url': url,
+                'series': series,
+                'checked_at': time.time(),
+            }
+            self.dirty = True
+
+    def invalidate(self, qualification, subject, spec=None):
+        with self.lock:
+            if self.entries.pop(self._key(qualification, subject, spec), None) is not None:
+                self.dirty = True
+                logging.info(f"Taxonomy entry for {subject} is stale; navigating by clicks")
+
+    def hit(self, ok):
+        with self.lock:
+            if ok:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            folder = os.path.dirname(self.path) or "."
+            fd, tmp_path = tempfile.mkstemp(prefix=".taxonomy", suffix=".part", dir=folder)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        if self.hits or self.misses:
+            logging.info(f"Taxonomy: {self.hits} deep links used, {self.misses} fell back to clicks")
@@ -0,0 +1,60 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import simulator
+from core import JOBS
+from downloader import STALE_PARTIAL_SECONDS
+
+RUN = "import sys, core; core.run('igcse-maths', backend='http', dest=sys.argv[1], metrics_interval=999)"
+
+class TwoRunsOneFolder(unittest.TestCase):
+    """Two core.run calls on one folder must not delete each other's temp files."""
+
+    def setUp(self):
+        self.server, self.page_url = simulator.start(scale=200, latency=0.01)
+        self.workdir = tempfile.mkdtemp(prefix="partials-")
+        job = JOBS['igcse-maths']
+        simulator.capture(self.page_url, job['qualification'], job['subjects'][0], spec=job['spec'],
+                          capture_path=os.path.join(self.workdir, "widget_capture.json"))
+        self.dest = os.path.join(self.workdir, "papers")
+        os.makedirs(self.dest)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def test_concurrent_runs_keep_live_partials(self):
+        # One left by a run killed long ago, one that stands for a sibling's download in progress
+        stale = os.path.join(self.dest, ".killed.pdf.part")
+        live = os.path.join(self.dest, ".sibling.pdf.part")
+        for path in (stale, live):
+            with open(path, "wb") as f:
+                f.write(b"%PDF-1.4")
+        old = time.time() - STALE_PARTIAL_SECONDS - 60
+        os.utime(stale, (old, old))
+
+        env = dict(os.environ, PAST_PAPERS_URL=self.page_url, PYTHONPATH=ROOT)
+        runs = [subprocess.Popen([sys.executable, "-c", RUN, self.dest], cwd=self.workdir, env=env,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.PIPE) for _ in range(2)]
+        for p in runs:
+            _, err = p.communicate(timeout=300)
+            self.assertEqual(p.returncode, 0, err.decode(errors="replace")[-2000:])
+
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(live))
+        partials = [n for _, _, files in os.walk(self.dest) for n in files if n.endswith(".part")]
+        self.assertEqual(partials, [os.path.basename(live)])
+        pdfs = [n for _, _, files in os.walk(self.dest) for n in files if n.endswith(".pdf")]
+        self.assertTrue(pdfs)
+
+if __name__ == "__main__":
+    unittest.main()
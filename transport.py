@@ -0,0 +1,124 @@
+import logging
+from urllib.parse import urlencode
+from requests.exceptions import ConnectionError, Timeout, HTTPError
+from http_backend import make_session as make_requests_session, USER_AGENT
+from ratelimit import throttled
+
+# httpx (with h2 for HTTP/2) is optional; without it only the requests transport is available
+try:
+    import httpx
+except ImportError:
+    httpx = None
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+TRANSPORTS = ["requests", "httpx"]
+KEEPALIVE_EXPIRY = 30.0
+
+class HttpxResponse:
+    """The part of requests.Response the download and fetch code uses, over an httpx response."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.TimeoutException as e:
+            raise Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+
+    @property
+    def content(self):
+        return self.response.read()
+
+    @property
+    def text(self):
+        self.response.read()
+        return self.response.text
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(f"{self.status_code} for url: {self.url}", response=self)
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class HttpxSession:
+    """A requests-like session over one httpx.Client, with HTTP/2 when h2 is installed.
+
+    On HTTP/2 every request to a host is a stream on one multiplexed
+    connection, instead of one pooled HTTP/1.1 connection per concurrent
+    download. Cookies and headers behave like a requests session's, so
+    prepare_session() can copy the browser's cookies and User-Agent into it.
+    A Throttle given by ratelimit.mount() paces and retries every request.
+    """
+
+    def __init__(self, pool_size=10, http2=True, keepalive_expiry=KEEPALIVE_EXPIRY):
+        if httpx is None:
+            raise ImportError("The httpx transport needs the httpx package (pip install 'httpx[http2]')")
+        if http2 and h2 is None:
+            logging.warning("h2 is not installed; the httpx transport falls back to HTTP/1.1")
+            http2 = False
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size,
+                              keepalive_expiry=keepalive_expiry)
+        self.client = httpx.Client(http2=http2, limits=limits, follow_redirects=True,
+                                   headers={"User-Agent": USER_AGENT})
+        self.headers = self.client.headers
+        self.cookies = self.client.cookies
+        # Called with every response, like requests' response hooks
+        self.hooks = {'response': []}
+        self.throttle = None
+
+    def request(self, method, url, timeout=30, stream=False, headers=None, **kwargs):
+        if self.throttle is None:
+            response = self._send(method, url, timeout, stream, headers, kwargs)
+        else:
+            response = throttled(self.throttle, method, url, lambda: self._send(method, url, timeout, stream, headers, kwargs), stream)
+        for hook in self.hooks['response']:
+            hook(response)
+        return response
+
+    def _send(self, method, url, timeout, stream, headers, kwargs):
+        # requests takes form bodies as a list of pairs; httpx wants them encoded
+        if isinstance(kwargs.get('data'), list):
+            kwargs = dict({k: v for k, v in kwargs.items() if k != 'data'}, content=urlencode(kwargs['data']))
+            headers = dict(headers or {}, **{"Content-Type": "application/x-www-form-urlencoded"})
+        try:
+            req = self.client.build_request(method, url, headers=headers, timeout=timeout, **kwargs)
+            return HttpxResponse(self.client.send(req, stream=stream))
+        except httpx.TimeoutException as e:
+            raise Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        self.client.close()
+
+def make_session(transport="requests", pool_size=10, http2=True, keepalive_expiry=KEEPALIVE_EXPIRY):
+    """A session for downloads and fetches on the chosen transport.
+
+    requests keeps a pool of pool_size HTTP/1.1 connections per host (urllib3
+    has no keep-alive expiry to tune); httpx uses HTTP/2 when it can.
+    """
+    if transport == "requests":
+        return make_requests_session(pool_size=pool_size)
+    if transport == "httpx":
+        return HttpxSession(pool_size=pool_size, http2=http2, keepalive_expiry=keepalive_expiry)
+    raise ValueError(f"Unknown transport {transport!r}; choose from {TRANSPORTS}")
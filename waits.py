@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+
+PROFILE_PATH = "wait_profile.json"
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def stable_count(by, selector, polls=3):
+    """Condition that holds once the number of matches has stopped changing (lazy loading)."""
+    history = []
+    def condition(driver):
+        history.append(len(driver.find_elements(by, selector)))
+        recent = history[-polls:]
+        return len(recent) == polls and recent[0] > 0 and len(set(recent)) == 1
+    return condition
+
+class WaitProfiler:
+    """Replaces fixed time.sleep calls with named, measured wait points.
+
+    wait() polls a postcondition and returns as soon as it holds, recording
+    how long the page took. Once a wait point has min_samples observations its
+    timeout becomes p99 * margin (plus a small floor) instead of the old fixed
+    delay. A wait that outlives a learned budget carries on up to the fixed
+    delay (or twice the budget), so a site that has slowed down is still
+    waited for and its slower times raise the budget. Observations persist
+    in PROFILE_PATH between runs. The browsers of a pool wait from their
+    own threads on one profiler, so its samples are only touched under self.lock.
+    """
+
+    def __init__(self, path=PROFILE_PATH, margin=1.5, floor=0.25, min_samples=5, max_samples=200, poll=0.1):
+        self.path = path
+        self.margin = margin
+        self.floor = floor
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.run = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.samples = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable wait profile {path}: {e}")
+
+    def budget(self, name, default):
+        with self.lock:
+            return self._budget(name, default)
+
+    def _budget(self, name, default):
+        samples = self.samples.get(name, [])
+        if len(samples) < self.min_samples:
+            return default
+        return percentile(samples, 99) * self.margin + self.floor
+
+    def wait(self, driver, name, condition, default):
+        """Wait until condition(driver) is truthy. Returns its value, or False on timeout."""
+        # A learned budget only knows the page's past speed; when it runs out the wait goes on to
+        # the fixed default (or twice the budget), so a slower site is sampled and the budget grows
+        with self.lock:
+            timeout = self._budget(name, default)
+            learned = len(self.samples.get(name, [])) >= self.min_samples
+        extended = max(default, timeout * 2) if learned else timeout
+        start = time.perf_counter()
+        result = False
+        while True:
+            try:
+                result = condition(driver)
+            except Exception:
+                result = False
+            elapsed = time.perf_counter() - start
+            if result or elapsed >= extended:
+                break
+            time.sleep(min(self.poll, max(extended - elapsed, 0)))
+        if result and elapsed >= timeout:
+            logging.info(f"Wait point '{name}' needed {elapsed:.2f}s, past its learned {timeout:.2f}s budget")
+
+        with self.lock:
+            stats = self.run.setdefault(name, {'calls': 0, 'timeouts': 0, 'waited': 0.0, 'fixed': 0.0, 'observed': []})
+            stats['calls'] += 1
+            stats['waited'] += elapsed
+            stats['fixed'] += default
+            if result:
+                stats['observed'].append(elapsed)
+                self.samples.setdefault(name, []).append(round(elapsed, 3))
+                self.samples[name] = self.samples[name][-self.max_samples:]
+            else:
+                stats['timeouts'] += 1
+        if not result:
+            logging.warning(f"Wait point '{name}' timed out after {elapsed:.2f}s")
+        return result
+
+    def save(self):
+        folder = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".wait_profile", suffix=".part", dir=folder)
+        with os.fdopen(fd, "w", encoding="utf-8") as f, self.lock:
+            json.dump(self.samples, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def report(self, path=None):
+        """Log time spent per wait point this run, slowest first, and optionally write it as JSON."""
+        rows = []
+        with self.lock:
+            for name, stats in self.run.items():
+                rows.append({
+                    'name': name,
+                    'calls': stats['calls'],
+                    'timeouts': stats['timeouts'],
+                    'p50': percentile(stats['observed'], 50),
+                    'p99': percentile(self.samples.get(name, []), 99),
+                    'budget': self._budget(name, stats['fixed'] / stats['calls']),
+                    'waited': round(stats['waited'], 3),
+                    'fixed_equivalent': round(stats['fixed'], 3),
+                    'saved': round(stats['fixed'] - stats['waited'], 3),
+                })
+        rows.sort(key=lambda r: r['waited'], reverse=True)
+
+        logging.info("Wait points (slowest first):")
+        for r in rows:
+            p50 = f"{r['p50']:.2f}s" if r['p50'] is not None else "-"
+            logging.info(f"  {r['name']}: {r['calls']} calls, {r['timeouts']} timeouts, p50 {p50}, waited {r['waited']:.1f}s vs {r['fixed_equivalent']:.1f}s fixed (saved {r['saved']:.1f}s)")
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+        return rows
+
+    def finish(self, report_path=None):
+        try:
+            self.save()
+        except Exception as e:
+            logging.warning(f"Could not save wait profile: {e}")
+        return self.report(report_path)
@@ -0,0 +1,399 @@
+import os
+import re
+import json
+import time
+import logging
+import argparse
+from http_backend import parse_results, parse_series
+from metrics import span
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, urljoin, quote
+
+# Overridable so every scraper can be pointed at a local simulator (simulator.py)
+PAST_PAPERS_URL = os.environ.get("PAST_PAPERS_URL", "https://qualifications.pearson.com/en/support/support-topics/exams/past-papers.html")
+CAPTURE_PATH = "widget_capture.json"
+LEVELS = ["qualification", "subject", "spec", "series", "document"]
+MAX_BODY = 200 * 1024
+
+# Ways a label can appear in a captured request parameter
+FORMATS = {
+    'exact': lambda label: label,
+    'lower': lambda label: label.lower(),
+    'slug': lambda label: re.sub(r'[^a-z0-9]+', '-', label.lower()).strip('-'),
+    'quoted': lambda label: quote(label),
+}
+
+class SchemaMismatch(Exception):
+    """Raised when a replayed endpoint no longer looks like the captured one."""
+
+def _norm(value):
+    return re.sub(r'[^a-z0-9]', '', str(value).lower())
+
+def _json(body):
+    try:
+        return json.loads(body)
+    except (TypeError, ValueError):
+        return None
+
+def _candidate_paths(obj, path=(), depth=0):
+    """Yield paths (with '*' for list traversal) that lead to lists of dicts."""
+    if depth > 6:
+        return
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from _candidate_paths(v, path + (k,), depth + 1)
+    elif isinstance(obj, list):
+        if any(isinstance(x, dict) for x in obj):
+            yield path
+        for x in obj[:50]:
+            if isinstance(x, (dict, list)):
+                yield from _candidate_paths(x, path + ('*',), depth + 1)
+
+def _resolve(obj, path):
+    items = [obj]
+    for key in path:
+        nxt = []
+        for item in items:
+            if key == '*':
+                if isinstance(item, list): nxt.extend(item)
+            elif isinstance(item, dict) and key in item:
+                nxt.append(item[key])
+        items = nxt
+    records = []
+    for item in items:
+        if isinstance(item, list):
+            records.extend(x for x in item if isinstance(x, dict))
+    return records
+
+def _matches(value, label, partial=False):
+    if not isinstance(value, (str, int)) or isinstance(value, bool):
+        return False
+    if partial:
+        return _norm(label) in _norm(value)
+    return _norm(value) == _norm(label)
+
+def _label_key(records, label):
+    for partial in (False, True):
+        for record in records:
+            for key, value in record.items():
+                if _matches(value, label, partial):
+                    return key, record
+    return None, None
+
+def _doc_keys(records):
+    """Pick the href and title fields of a document listing, or (None, None)."""
+    href_key = None
+    for key in records[0]:
+        hits = sum(1 for r in records if '.pdf' in str(r.get(key, '')).lower())
+        if hits and hits >= len(records) / 2:
+            href_key = key
+            break
+    if not href_key:
+        return None, None
+    title_key = None
+    best = 0
+    for key in records[0]:
+        if key == href_key: continue
+        values = [r.get(key) for r in records if isinstance(r.get(key), str)]
+        if not values: continue
+        score = sum(len(v) for v in values) / len(values)
+        if re.search(r'title|name|label', str(key), re.I):
+            score *= 4
+        if score > best:
+            best, title_key = score, key
+    return href_key, title_key
+
+def _reference(value, level, chosen, labels):
+    """Describe a captured parameter value in terms of the records selected at earlier levels."""
+    if not isinstance(value, str) or len(value) < 2:
+        return value
+    for parent in reversed(LEVELS[:LEVELS.index(level)]):
+        record = chosen.get(parent)
+        if record:
+            for key, v in record.items():
+                if isinstance(v, (str, int)) and not isinstance(v, bool) and str(v) == value:
+                    return {'ref': parent, 'field': key}
+        label = labels.get(parent)
+        if label:
+            for fmt, func in FORMATS.items():
+                if func(label) == value:
+                    return {'ref': parent, 'format': fmt}
+    return value
+
+def _template(call, level, chosen, labels):
+    # A call whose whole URL is a field of an earlier record (e.g. a series link's href)
+    for parent in reversed(LEVELS[:LEVELS.index(level)]):
+        for key, v in (chosen.get(parent) or {}).items():
+            if isinstance(v, str) and v == call['url'] and not call.get('post_data'):
+                return {'method': call['method'], 'url': {'ref': parent, 'field': key}}
+
+    parts = urlsplit(call['url'])
+    segments = [_reference(seg, level, chosen, labels) for seg in parts.path.split('/')]
+    query = [[k, _reference(v, level, chosen, labels)] for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    body = None
+    if call.get('post_data'):
+        as_json = _json(call['post_data'])
+        if isinstance(as_json, dict):
+            body = {'json': {k: _reference(v, level, chosen, labels) for k, v in as_json.items()}}
+        else:
+            body = {'form': [[k, _reference(v, level, chosen, labels)] for k, v in parse_qsl(call['post_data'], keep_blank_values=True)]}
+    return {
+        'method': call['method'],
+        'base': urlunsplit((parts.scheme, parts.netloc, '', '', '')),
+        'segments': segments,
+        'query': query,
+        'body': body,
+    }
+
+def _fill(value, chosen, labels):
+    if not isinstance(value, dict):
+        return value
+    if 'field' in value:
+        record = chosen.get(value['ref'])
+        if not record or value['field'] not in record:
+            raise SchemaMismatch(f"no {value['ref']}.{value['field']} to fill request")
+        return str(record[value['field']])
+    label = labels.get(value['ref'])
+    if not label:
+        raise SchemaMismatch(f"no {value['ref']} label to fill request")
+    return FORMATS[value['format']](label)
+
+def _html_records(level, body, url):
+    if level == 'series':
+        return parse_series(body, url)
+    if level == 'document':
+        return parse_results(body, url)
+    return []
+
+def _candidates(level, call):
+    """Yield (format, path, records) for every record list a captured response offers."""
+    data = _json(call['body'])
+    if data is not None:
+        for path in dict.fromkeys(_candidate_paths(data)):
+            yield 'json', path, _resolve(data, path)
+    elif 'html' in call.get('content_type', ''):
+        yield 'html', (), _html_records(level, call['body'], call['url'])
+
+def build_schema(calls, labels):
+    """Work out which captured call serves each widget level and how its parameters are built.
+
+    JSON responses are searched for a list of records containing the clicked
+    label; series and document levels also accept HTML fragments or pages.
+    """
+    endpoints = {}
+    chosen = {}
+    for level in LEVELS:
+        label = labels.get(level)
+        if level != 'document' and not label:
+            continue
+        for call in calls:
+            if call['status'] != 200:
+                continue
+            for fmt, path, records in _candidates(level, call):
+                if not records:
+                    continue
+                if level == 'document':
+                    href_key, title_key = _doc_keys(records)
+                    if not href_key:
+                        continue
+                    endpoint = {'href_key': href_key, 'title_key': title_key}
+                else:
+                    key, record = _label_key(records, label)
+                    if not key:
+                        continue
+                    endpoint = {'label_key': key, 'partial': not _matches(record[key], label)}
+                endpoint['format'] = fmt
+                endpoint['request'] = _template(call, level, chosen, labels)
+                endpoint['path'] = list(path)
+                endpoint['keys'] = sorted(set.intersection(*(set(r) for r in records)))
+                endpoints[level] = endpoint
+                if level != 'document':
+                    chosen[level] = record
+                break
+            if level in endpoints:
+                break
+        if level in endpoints:
+            req = endpoints[level]['request']
+            where = req['url'] if 'url' in req else req['base'] + '/'.join(str(s) for s in req['segments'])
+            logging.info(f"Captured {level} endpoint ({endpoints[level]['format']}): {req['method']} {where}")
+        else:
+            logging.warning(f"No endpoint found for {level}")
+    return endpoints
+
+def discover(qualification, subject, series, spec=None, letter=None, capture_path=CAPTURE_PATH, headless=True):
+    """Drive the widget once in Playwright and record the background calls behind each step."""
+    from playwright.sync_api import sync_playwright
+
+    letter = letter or subject[0].upper()
+    labels = {'qualification': qualification, 'subject': subject, 'spec': spec, 'series': series}
+    calls = []
+    pending = []
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=headless)
+        page = browser.new_page()
+        page.on("response", lambda r: pending.append(r) if r.request.resource_type in ("xhr", "fetch", "document") else None)
+
+        def collect(step):
+            try:
+                page.wait_for_load_state("networkidle", timeout=15000)
+            except Exception:
+                pass
+            while pending:
+                r = pending.pop(0)
+                try:
+                    body = r.text()
+                except Exception:
+                    continue
+                calls.append({
+                    'step': step,
+                    'method': r.request.method,
+                    'url': r.url,
+                    'post_data': r.request.post_data,
+                    'status': r.status,
+                    'content_type': r.headers.get('content-type', ''),
+                    'body': body[:MAX_BODY],
+                })
+
+        try:
+            page.goto(PAST_PAPERS_URL, timeout=60000)
+            try:
+                page.click("#onetrust-accept-btn-handler", timeout=5000)
+            except:
+                logging.info("No cookie banner found")
+            page.wait_for_selector(".findpastpapers", timeout=30000)
+            collect("initial")
+
+            widget = page.locator(".findpastpapers")
+            steps = [
+                ("qualification", widget.get_by_text(qualification, exact=True)),
+                ("letter", widget.locator("li").filter(has_text=re.compile(f"^\\s*{re.escape(letter)}\\s*$"))),
+                ("subject", widget.get_by_role("link").filter(has_text=subject)),
+            ]
+            if spec:
+                steps.append(("spec", page.locator("a").filter(has=page.locator("h3", has_text=spec))))
+            steps.append(("series", page.locator("#step3 a").filter(has_text=series)))
+
+            for step, locator in steps:
+                try:
+                    locator.filter(visible=True).first.click(force=True, timeout=15000)
+                    logging.info(f"Clicked {step}")
+                except Exception as e:
+                    logging.warning(f"Could not click {step}: {e}")
+                collect(step)
+        finally:
+            browser.close()
+
+    capture = {
+        'captured_at': time.time(),
+        'labels': labels,
+        'endpoints': build_schema(calls, labels),
+        'calls': calls,
+    }
+    with open(capture_path, "w", encoding="utf-8") as f:
+        json.dump(capture, f, indent=1)
+    logging.info(f"Saved {len(calls)} captured calls to {capture_path}")
+    return capture
+
+class WidgetApi:
+    """Replays the captured widget endpoints with a plain requests session.
+
+    JSON endpoints are read along their captured path; HTML endpoints go
+    through http_backend's parser, so no browser is needed for either.
+    """
+
+    def __init__(self, session, capture):
+        self.session = session
+        self.endpoints = capture['endpoints']
+
+    @classmethod
+    def load(cls, session, capture_path=CAPTURE_PATH):
+        with open(capture_path, encoding="utf-8") as f:
+            return cls(session, json.load(f))
+
+    def fetch(self, level, chosen, labels):
+        endpoint = self.endpoints.get(level)
+        if not endpoint:
+            raise SchemaMismatch(f"no {level} endpoint captured")
+        req = endpoint['request']
+        kwargs = {}
+        if 'url' in req:
+            url = urljoin(PAST_PAPERS_URL, _fill(req['url'], chosen, labels))
+        else:
+            path = '/'.join(_fill(seg, chosen, labels) for seg in req['segments'])
+            query = urlencode([(k, _fill(v, chosen, labels)) for k, v in req['query']])
+            url = req['base'] + path + (f"?{query}" if query else "")
+            if req['body'] and 'json' in req['body']:
+                kwargs['json'] = {k: _fill(v, chosen, labels) for k, v in req['body']['json'].items()}
+            elif req['body']:
+                kwargs['data'] = [(k, _fill(v, chosen, labels)) for k, v in req['body']['form']]
+
+        with span(f"api.{level}") as s:
+            r = self.session.request(req['method'], url, timeout=30, **kwargs)
+            s.attrs['status'] = r.status_code
+            s.add("bytes", len(r.content))
+            if r.status_code != 200:
+                raise SchemaMismatch(f"{level} endpoint returned {r.status_code}")
+        return endpoint, r
+
+    def records(self, level, chosen, labels):
+        endpoint, r = self.fetch(level, chosen, labels)
+        if endpoint.get('format') == 'html':
+            records = _html_records(level, r.text, r.url)
+        else:
+            payload = _json(r.text)
+            if payload is None:
+                raise SchemaMismatch(f"{level} endpoint no longer returns JSON")
+            records = _resolve(payload, endpoint['path'])
+        if not records:
+            raise SchemaMismatch(f"{level} endpoint returned no records at {endpoint['path']}")
+        missing = set(endpoint['keys']) - set(records[0])
+        if missing:
+            raise SchemaMismatch(f"{level} records are missing {sorted(missing)}")
+        return records
+
+    def select(self, level, label, chosen, labels):
+        endpoint = self.endpoints[level]
+        for record in self.records(level, chosen, labels):
+            if _matches(record.get(endpoint['label_key']), label, endpoint['partial']):
+                return record
+        raise SchemaMismatch(f"{label!r} is not offered by the {level} endpoint")
+
+    def documents(self, chosen, labels):
+        endpoint = self.endpoints.get('document', {})
+        docs = []
+        for d in self.records('document', chosen, labels):
+            href = d.get(endpoint['href_key'])
+            if not href: continue
+            docs.append({'href': urljoin(PAST_PAPERS_URL, str(href)), 'title': str(d.get(endpoint['title_key']) or '').strip()})
+        return docs
+
+    def iter_series_documents(self, qualification, subject, spec=None, series_filter=None):
+        """Yield (series_name, [{'href', 'title'}]) for every series of a subject without a browser."""
+        labels = {'qualification': qualification, 'subject': subject, 'spec': spec}
+        chosen = {}
+        for level in ('qualification', 'subject', 'spec'):
+            if labels[level] and level in self.endpoints:
+                chosen[level] = self.select(level, labels[level], chosen, labels)
+
+        key = self.endpoints.get('series', {}).get('label_key')
+        for record in self.records('series', chosen, labels):
+            name = str(record.get(key, '')).strip()
+            if not name or (series_filter and not series_filter(name)):
+                continue
+            chosen['series'] = record
+            labels['series'] = name
+            yield name, self.documents(chosen, labels)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Capture the past-papers widget's background requests")
+    parser.add_argument("--qualification", default="International GCSE")
+    parser.add_argument("--subject", default="Mathematics B")
+    parser.add_argument("--spec", default="(2016)")
+    parser.add_argument("--series", default="June 2019")
+    parser.add_argument("--letter")
+    parser.add_argument("--output", default=CAPTURE_PATH)
+    parser.add_argument("--headful", action="store_true")
+    args = parser.parse_args()
+    discover(args.qualification, args.subject, args.series, spec=args.spec, letter=args.letter,
+             capture_path=args.output, headless=not args.headful)
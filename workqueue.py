@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+import multiprocessing
+
+QUEUE_PATH = "workqueue.db"
+LEASE_SECONDS = 300
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    qualification TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    spec TEXT NOT NULL DEFAULT '',
+    series TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result TEXT,
+    created REAL,
+    updated REAL,
+    UNIQUE (job, qualification, subject, spec, series)
+);
+CREATE INDEX IF NOT EXISTS units_claim ON units (status, lease_expires);
+"""
+
+def owner_name():
+    """host:pid, unique across the machines sharing a queue."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class WorkQueue:
+    """Durable queue of crawl units in one SQLite file, shared by any number of worker processes.
+
+    A unit is one qualification × subject × spec × series. A unit with no
+    series is a listing unit: its worker lists the subject's series and adds
+    one unit per series. A worker claims a unit with a lease and renews it
+    with heartbeat(); a unit whose lease runs out (its worker died or hung)
+    goes back to the queue and is claimed again, up to max_attempts.
+
+    A claim selects and leases a unit inside one BEGIN IMMEDIATE
+    transaction, so two workers never get the same live unit. On a local disk the file uses WAL; network=True
+    (a queue on NFS / SMB shared between machines) keeps the rollback
+    journal, since WAL needs shared memory that network filesystems do not
+    provide.
+    """
+
+    def __init__(self, path=QUEUE_PATH, network=False, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute(f"PRAGMA journal_mode={'DELETE' if network else 'WAL'}")
+        self.db.execute("PRAGMA synchronous=NORMAL" if not network else "PRAGMA synchronous=FULL")
+        self.db.executescript(SCHEMA)
+
+    def add(self, job, qualification, subject, spec=None, series=None):
+        """Queue a unit unless it is already queued. Returns True when it was new."""
+        now = time.time()
+        cur = self.db.execute("INSERT OR IGNORE INTO units (job, qualification, subject, spec, series, created, updated) "
+                              "VALUES (?, ?, ?, ?, ?, ?, ?)", (job, qualification, subject, spec or "", series or "", now, now))
+        return cur.rowcount == 1
+
+    def claim(self, owner, lease=LEASE_SECONDS, job=None):
+        """Lease the next pending or expired unit (of job, if given) to owner. Returns the unit as a dict, or None."""
+        now = time.time()
+        where = "(status = 'pending' OR (status = 'leased' AND lease_expires < ?)) AND attempts < ?"
+        args = [now, self.max_attempts]
+        if job:
+            where += " AND job = ?"
+            args.append(job)
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # A worker that died on a unit's last attempt leaves it failed rather than leased forever
+            self.db.execute("UPDATE units SET status = 'failed', last_error = 'lease expired', updated = ? "
+                            "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, now, self.max_attempts))
+            # Listing units first, so series units are available to every worker as soon as possible
+            row = self.db.execute(f"SELECT * FROM units WHERE {where} ORDER BY series != '', id LIMIT 1", args).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            if row['status'] == "leased":
+                logging.warning(f"Lease of unit {row['id']} held by {row['owner']} expired; re-queued")
+            self.db.execute("UPDATE units SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1, updated = ? "
+                            "WHERE id = ?", (owner, now + lease, now, row['id']))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        unit = dict(row)
+        unit['attempts'] += 1
+        return unit
+
+    def heartbeat(self, unit_id, owner, lease=LEASE_SECONDS):
+        """Extend owner's lease on a unit. False when the lease was lost to another worker."""
+        cur = self.db.execute("UPDATE units SET lease_expires = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                              (time.time() + lease, time.time(), unit_id, owner))
+        return cur.rowcount == 1
+
+    def complete(self, unit_id, owner, result=None):
+        """Mark a unit done. False when owner no longer held it (another worker finishes it instead)."""
+        cur = self.db.execute("UPDATE units SET status = 'done', lease_expires = NULL, result = ?, last_error = NULL, updated = ? "
+                              "WHERE id = ? AND owner = ? AND status = 'leased'",
+                              (json.dumps(result) if result is not None else None, time.time(), unit_id, owner))
+        return cur.rowcount == 1
+
+    def fail(self, unit_id, owner, error):
+        """Give a unit back after an error: pending again, or failed once it has used max_attempts."""
+        cur = self.db.execute("UPDATE units SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                              "lease_expires = NULL, last_error = ?, updated = ? WHERE id = ? AND owner = ? AND status = 'leased'",
+                              (self.max_attempts, str(error)[:500], time.time(), unit_id, owner))
+        return cur.rowcount == 1
+
+    def outstanding(self, job=None):
+        """Units still to do or in progress; 0 means every worker can stop."""
+        sql = "SELECT COUNT(*) FROM units WHERE ((status = 'pending' AND attempts < ?) OR status = 'leased')"
+        args = [self.max_attempts]
+        if job:
+            sql += " AND job = ?"
+            args.append(job)
+        return self.db.execute(sql, args).fetchone()[0]
+
+    def stats(self, job=None):
+        """Unit counts by job and status, with the lease holders of units in progress."""
+        sql = "SELECT job, status, COUNT(*) AS n FROM units"
+        args = []
+        if job:
+            sql += " WHERE job = ?"
+            args.append(job)
+        stats = {}
+        for r in self.db.execute(sql + " GROUP BY job, status", args):
+            stats.setdefault(r['job'], {})[r['status']] = r['n']
+        for r in self.db.execute("SELECT job, owner, lease_expires FROM units WHERE status = 'leased'"):
+            if job is None or r['job'] == job:
+                state = "expired" if r['lease_expires'] < time.time() else "live"
+                stats[r['job']].setdefault('owners', {})[r['owner']] = state
+        return stats
+
+    def failed(self, job=None):
+        sql = "SELECT * FROM units WHERE status = 'failed'" + (" AND job = ?" if job else "")
+        return [dict(r) for r in self.db.execute(sql, [job] if job else [])]
+
+    def retry_failed(self, job=None):
+        """Give failed units a fresh set of attempts. Returns how many were re-queued."""
+        sql = "UPDATE units SET status = 'pending', attempts = 0, updated = ? WHERE status = 'failed'" + (" AND job = ?" if job else "")
+        return self.db.execute(sql, [time.time()] + ([job] if job else [])).rowcount
+
+    def reset(self, job):
+        """Forget every unit of job, so the next plan crawls it afresh. Returns how many were removed."""
+        return self.db.execute("DELETE FROM units WHERE job = ?", (job,)).rowcount
+
+    def close(self):
+        self.db.close()
+
+class Heartbeat:
+    """Renews a unit's lease every lease/3 seconds while the unit is being worked on."""
+
+    def __init__(self, path, unit_id, owner, lease=LEASE_SECONDS, network=False):
+        self.path = path
+        self.network = network
+        self.unit_id = unit_id
+        self.owner = owner
+        self.lease = lease
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        # sqlite3 connections belong to one thread, so the heartbeat has its own
+        queue = WorkQueue(self.path, network=self.network)
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                try:
+                    if not queue.heartbeat(self.unit_id, self.owner, self.lease):
+                        logging.warning(f"Lost the lease on unit {self.unit_id}; another worker will redo it")
+                        self.lost = True
+                        return
+                except sqlite3.Error as e:
+                    logging.warning(f"Heartbeat for unit {self.unit_id} failed: {e}")
+        finally:
+            queue.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+def plan(queue, name, subjects=None):
+    """Queue one listing unit per subject of job name. Returns how many were new."""
+    from core import JOBS
+    job = JOBS[name]
+    added = 0
+    for subject in subjects or job['subjects']:
+        added += queue.add(name, job['qualification'], subject, job.get('spec'))
+    logging.info(f"Planned {name}: {added} new listing units, {queue.outstanding(name)} outstanding")
+    return added
+
+def _worker(name, queue_path, options):
+    from core import run
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - {owner_name()} - %(levelname)s - %(message)s')
+    stats = run(name, queue_path=queue_path, **options)
+    return {k: v for k, v in stats.items() if k != 'series_seconds'}
+
+def work(name, queue_path=QUEUE_PATH, processes=1, **options):
+    """Run processes workers for job name against the queue at queue_path until it is drained.
+
+    options are passed on to core.run (backend, workers, lease, network, ...).
+    Each process drives its own browser; start the same command on other
+    machines sharing queue_path to spread a backfill over several boxes.
+    """
+    if processes == 1:
+        return [_worker(name, queue_path, options)]
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        return pool.starmap(_worker, [(name, queue_path, options)] * processes)
+
+if __name__ == "__main__":
+    from core import JOBS
+    from backends import BACKENDS
+    from transport import TRANSPORTS
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+    parser = argparse.ArgumentParser(description="Crawl a job as work units shared by any number of worker processes and machines")
+    parser.add_argument("command", choices=["plan", "work", "status", "retry", "reset"])
+    parser.add_argument("job", nargs="?", choices=sorted(JOBS))
+    parser.add_argument("--queue", default=QUEUE_PATH, help="queue file; put it on a shared filesystem for several machines")
+    parser.add_argument("--network", action="store_true", help="the queue is on a network filesystem (no WAL)")
+    parser.add_argument("--subject", action="append", help="plan only this subject (repeatable)")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes on this machine, one browser each")
+    parser.add_argument("--workers", type=int, default=4, help="download threads per worker process")
+    parser.add_argument("--backend", choices=BACKENDS, default="selenium")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="requests")
+    parser.add_argument("--lease", type=int, default=LEASE_SECONDS, help="seconds before a silent worker's unit is re-queued")
+    parser.add_argument("--headless", action="store_true")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue, network=args.network)
+    if args.command == "status":
+        print(json.dumps(queue.stats(args.job), indent=2))
+        for unit in queue.failed(args.job):
+            print(json.dumps({k: unit[k] for k in ('id', 'job', 'subject', 'series', 'attempts', 'last_error')}))
+        sys.exit(0)
+    if args.job is None:
+        sys.exit(f"{args.command} needs a job: {', '.join(sorted(JOBS))}")
+    if args.command == "retry":
+        logging.info(f"Re-queued {queue.retry_failed(args.job)} failed units")
+        sys.exit(0)
+    if args.command == "reset":
+        # Done units stay done; a later refresh of the same job starts from a reset
+        logging.info(f"Removed {queue.reset(args.job)} units of {args.job}")
+        sys.exit(0)
+    plan(queue, args.job, args.subject)
+    queue.close()
+    if args.command == "work":
+        results = work(args.job, args.queue, processes=args.processes, backend=args.backend, workers=args.workers,
+                       transport=args.transport, headless=args.headless,
+                       lease=args.lease, network=args.network)
+        print(json.dumps(results, indent=2, default=str))